@@ -5,4 +5,5 @@ from .models import *
 admin.site.register(Survey)
 admin.site.register(Question)
 admin.site.register(AnswerOption)
-admin.site.register(UserResponse)
\ No newline at end of file
+admin.site.register(UserResponse)
+admin.site.register(Submission)
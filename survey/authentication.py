@@ -0,0 +1,131 @@
+"""Подписанные токены для API: без строк сессий, пользователь — из кэша в памяти процесса"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import signing
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework import authentication, exceptions
+
+TOKEN_SALT = 'survey.api-token'
+KEYWORD = 'Bearer'
+# Кэш пользователей не растёт бесконечно: при переполнении сбрасывается целиком
+MAX_PRINCIPALS = 10000
+
+_principals = {}
+_lock = threading.Lock()
+
+
+def token_max_age():
+    return getattr(settings, 'API_TOKEN_MAX_AGE', 7 * 24 * 3600)
+
+
+def _password_key(user):
+    # Токен привязан к хэшу пароля: смена или сброс пароля отзывает все выданные токены
+    return salted_hmac(TOKEN_SALT, user.password, algorithm='sha256').hexdigest()[:16]
+
+
+def issue_token(user):
+    """Подписанный токен пользователя со временем выдачи; в БД ничего не пишется"""
+    return signing.dumps({'u': user.pk, 'k': _password_key(user)}, salt=TOKEN_SALT)
+
+
+def _cached(user_id):
+    entry = _principals.get(user_id)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _remember(user):
+    with _lock:
+        if len(_principals) >= MAX_PRINCIPALS:
+            _principals.clear()
+        _principals[user.pk] = (time.monotonic() + getattr(settings, 'API_PRINCIPAL_TTL', 30), user)
+
+
+def get_principal(user_id):
+    """Пользователь по id: из кэша процесса, при промахе — один запрос к БД; копия, чтобы запросы не делили объект"""
+    user = _cached(user_id)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        _remember(user)
+    return copy.copy(user)
+
+
+async def aget_principal(user_id):
+    """Асинхронный вариант get_principal"""
+    user = _cached(user_id)
+    if user is None:
+        user = await User.objects.filter(pk=user_id).afirst()
+        if user is None:
+            return None
+        _remember(user)
+    return copy.copy(user)
+
+
+def forget_user(user_id):
+    """Убирает пользователя из кэша процесса (вызывается при любом сохранении или удалении пользователя)"""
+    with _lock:
+        _principals.pop(user_id, None)
+
+
+def clear_principals():
+    with _lock:
+        _principals.clear()
+
+
+def token_from_header(request):
+    """Токен из заголовка Authorization: Bearer <токен> или None, если заголовка нет"""
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if not header or header[0] != KEYWORD:
+        return None
+    if len(header) != 2:
+        raise exceptions.AuthenticationFailed("Некорректный заголовок Authorization.")
+    return header[1]
+
+
+def _user_id(token):
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=token_max_age())
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed("Срок действия токена истёк.")
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed("Недействительный токен.")
+    return payload['u'], payload['k']
+
+
+def _check(user, key):
+    if user is None or not user.is_active or not constant_time_compare(key, _password_key(user)):
+        raise exceptions.AuthenticationFailed("Недействительный токен.")
+    return user
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """Authorization: Bearer <токен>; без заголовка передаёт запрос следующему классу (сессии)"""
+
+    def authenticate(self, request):
+        token = token_from_header(request)
+        if token is None:
+            return None
+        user_id, key = _user_id(token)
+        return _check(get_principal(user_id), key), token
+
+    def authenticate_header(self, request):
+        return KEYWORD
+
+
+async def aauthenticate(request):
+    """Пользователь асинхронного представления: токен, если он передан, иначе сессия; AnonymousUser при ошибке"""
+    try:
+        token = token_from_header(request)
+        if token is None:
+            return await request.auser()
+        user_id, key = _user_id(token)
+        return _check(await aget_principal(user_id), key)
+    except exceptions.AuthenticationFailed:
+        return AnonymousUser()
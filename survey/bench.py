@@ -0,0 +1,258 @@
+"""Синтетический набор данных и замеры эндпоинтов для команды manage.py bench"""
+import math
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Survey, Question, AnswerOption, UserResponse, Submission
+from . import tallies, urls
+
+BENCH_PASSWORD = 'bench-pass-123'
+WORDS = ['доставка', 'цена', 'качество', 'сервис', 'сайт', 'скорость', 'поддержка', 'упаковка']
+
+
+def seed(surveys=5, questions=10, options=4, responses=1000, users=50, seed=0):
+    """Заполняет БД синтетическими данными пакетными вставками и возвращает контекст для маршрутов"""
+    rng = random.Random(seed)
+    today = timezone.now().date()
+    unusable = make_password(None)
+    with transaction.atomic():
+        admin = User.objects.create(username='bench_admin', password=unusable, is_staff=True)
+        login_user = User.objects.create_user(username='bench_login', password=BENCH_PASSWORD)
+        respondents = User.objects.bulk_create([
+            User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com', password=unusable)
+            for i in range(max(users, 1))
+        ])
+        survey_objs = Survey.objects.bulk_create([
+            Survey(title=f'Опрос {i}', description=' '.join(rng.choices(WORDS, k=30)),
+                   start_date=today - timezone.timedelta(days=rng.randint(1, 30)),
+                   end_date=today + timezone.timedelta(days=rng.randint(1, 30)))
+            for i in range(max(surveys, 1))
+        ])
+        question_objs = Question.objects.bulk_create([
+            Question(survey=survey, text=f'Вопрос {survey.id}.{j}',
+                     question_type='text' if j % 5 == 4 else ('single' if j % 2 == 0 else 'multiple'))
+            for survey in survey_objs for j in range(max(questions, 1))
+        ])
+        option_objs = AnswerOption.objects.bulk_create([
+            AnswerOption(question=question, text=f'Вариант {k}')
+            for question in question_objs if question.question_type != 'text' for k in range(max(options, 1))
+        ])
+        options_by_question = {}
+        for option in option_objs:
+            options_by_question.setdefault(option.question_id, []).append(option)
+
+        def make_response(question, user):
+            if question.question_type == 'text':
+                return UserResponse(question=question, user=user, text_response=' '.join(rng.choices(WORDS, k=8)))
+            return UserResponse(question=question, user=user, selected_option=rng.choice(options_by_question[question.id]))
+
+        response_objs = [make_response(question_objs[0], respondents[0])]
+        response_objs += [make_response(rng.choice(question_objs), rng.choice(respondents)) for _ in range(responses)]
+        submission_objs = {}
+        for response in response_objs:
+            key = (response.question.survey_id, response.user_id)
+            if key not in submission_objs:
+                submission_objs[key] = Submission(survey_id=key[0], user_id=key[1])
+            response.submission = submission_objs[key]
+        Submission.objects.bulk_create(submission_objs.values(), batch_size=5000)
+        response_objs = UserResponse.objects.bulk_create(response_objs, batch_size=5000)
+    tallies.rebuild()
+
+    survey = survey_objs[0]
+    survey_questions = [question for question in question_objs if question.survey_id == survey.id]
+    choice_question = next((q for q in survey_questions if q.question_type != 'text'), survey_questions[0])
+    return {
+        'admin': admin,
+        'user': respondents[0],
+        'login_user': login_user,
+        'survey': survey,
+        'survey_questions': survey_questions,
+        'options_by_question': options_by_question,
+        'question': choice_question,
+        'option': options_by_question.get(choice_question.id, [None])[0],
+        'response': response_objs[0],
+        'dataset': {'surveys': len(survey_objs), 'questions': len(question_objs), 'options': len(option_objs),
+                    'responses': len(response_objs), 'users': len(respondents)},
+    }
+
+
+def _submit_data(context):
+    data = {}
+    for question in context['survey_questions']:
+        if question.question_type == 'text':
+            data[f'text_{question.id}'] = 'bench'
+        else:
+            data[f'option_{question.id}'] = context['options_by_question'][question.id][0].id
+    return data
+
+
+def _batch_data(context, size=100):
+    items = []
+    questions = context['survey_questions']
+    for i in range(size):
+        question = questions[i % len(questions)]
+        if question.question_type == 'text':
+            items.append({'question': question.id, 'text_response': 'bench'})
+        else:
+            items.append({'question': question.id,
+                          'selected_option': context['options_by_question'][question.id][0].id})
+    return {'responses': items}
+
+
+def routes(context):
+    """Маршруты survey/urls.py с параметрами: (имя, метод, путь, роль, данные, перелогин)"""
+    s = {'survey_id': context['survey'].id}
+    q = {'survey_id': context['survey'].id, 'question_id': context['question'].id}
+    option_id = context['option'].id if context['option'] else 0
+    submit = _submit_data(context)
+    batch = _batch_data(context)
+    choices = [q.id for q in context['survey_questions'] if q.question_type != 'text'] or [context['question'].id]
+
+    def route(name, method='get', role='user', kwargs=None, data=None, query='', relogin=False, json=False):
+        return {'name': name, 'method': method, 'path': reverse(name, kwargs=kwargs) + query,
+                'role': role, 'data': data, 'relogin': relogin, 'json': json}
+
+    return [
+        route('survey_list', role='anon'),
+        route('login', role='anon'),
+        route('register', role='anon'),
+        route('logout', relogin=True),
+        route('profile'),
+        route('create_survey', role='admin'),
+        route('survey_detail', kwargs=s),
+        route('submit_response', method='post', kwargs=s, data=lambda i: submit),
+        route('survey_results', kwargs=s),
+        route('add_question', role='admin', kwargs=s),
+        route('edit_survey', role='admin', kwargs=s),
+        route('delete_survey', role='admin', kwargs=s),
+        route('manage_users', role='admin'),
+        route('create_user', role='admin'),
+        route('api-root'),
+        route('users-list', role='admin'),
+        route('users-detail', role='admin', kwargs={'pk': context['user'].id}),
+        route('surveys-list'),
+        route('surveys-detail', kwargs={'pk': context['survey'].id}),
+        route('questions-list'),
+        route('questions-detail', kwargs={'pk': context['question'].id}),
+        route('answers-list'),
+        route('answers-detail', kwargs={'pk': option_id}),
+        route('responses-list'),
+        route('responses-detail', kwargs={'pk': context['response'].id}),
+        route('api_register', method='post', role='anon', json=True,
+              data=lambda i: {'username': f'bench_new_{i}_{time.monotonic_ns()}', 'password': 'bench-pass-123'}),
+        route('api_login', method='post', role='anon', json=True,
+              data=lambda i: {'username': 'bench_login', 'password': BENCH_PASSWORD}),
+        route('api_token', method='post', role='anon', json=True,
+              data=lambda i: {'username': 'bench_login', 'password': BENCH_PASSWORD}),
+        route('api_logout', method='post', relogin=True),
+        route('change-password', method='post', json=True,
+              data=lambda i: {'old_password': 'wrong-password', 'new_password': 'irrelevant-123'}),
+        route('reset-password', method='post', role='admin', json=True,
+              data=lambda i: {'user_id': context['login_user'].id, 'new_password': BENCH_PASSWORD}),
+        route('question-autocomplete', query='?q=1'),
+        route('survey-statistics', kwargs=s),
+        route('survey-crosstab', kwargs=s, query=f'?row={choices[0]}&col={choices[-1]}'),
+        route('survey-questions', kwargs=s),
+        route('survey-definition', kwargs=s),
+        route('survey-answers', kwargs=s),
+        route('survey-answers-by-question', kwargs=q),
+        route('survey-search', kwargs=s, query=f'?q={WORDS[0]}'),
+        route('survey-timeline', kwargs=s, query='?granularity=minute'),
+        route('survey-export', role='admin', kwargs=s),
+        route('survey-snapshot', role='admin', kwargs=s),
+        route('survey-responses-batch', method='post', kwargs=s, json=True, data=lambda i: batch),
+        route('async-survey-list'),
+        route('async-survey-questions', kwargs=s),
+        route('async-survey-statistics', kwargs=s),
+        route('async-survey-answers', kwargs=s),
+    ]
+
+
+def url_names(patterns=None):
+    """Все именованные маршруты survey/urls.py, включая маршруты роутера"""
+    names = set()
+    for pattern in urls.urlpatterns if patterns is None else patterns:
+        if hasattr(pattern, 'url_patterns'):
+            names |= url_names(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def _percentile(values, fraction):
+    """Перцентиль методом ближайшего ранга"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _call(client, route, iteration):
+    data = route['data'](iteration) if route['data'] else None
+    kwargs = {'content_type': 'application/json'} if route['json'] else {}
+    response = getattr(client, route['method'])(route['path'], data, **kwargs)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def run(context, iterations=20, names=None):
+    """Прогоняет маршруты через тестовый клиент: число запросов, p50/p95 задержки, пик памяти"""
+    clients = {'anon': Client(), 'user': Client(), 'admin': Client()}
+    clients['user'].force_login(context['user'])
+    clients['admin'].force_login(context['admin'])
+    endpoints = {}
+    for route in routes(context):
+        if names and route['name'] not in names:
+            continue
+
+        def prepare():
+            """Готовит клиента вне замера: выход из системы не должен разлогинить общих клиентов"""
+            if route['role'] == 'anon':
+                clients['anon'].cookies.clear()
+                return clients['anon']
+            if route['relogin']:
+                client = Client()
+                client.force_login(context[route['role']])
+                return client
+            return clients[route['role']]
+
+        _call(prepare(), route, -1)  # прогрев кэшей
+        timings = []
+        for i in range(iterations):
+            client = prepare()
+            start = time.perf_counter()
+            _call(client, route, i)
+            timings.append((time.perf_counter() - start) * 1000)
+        client = prepare()
+        with CaptureQueriesContext(connection) as queries:
+            response = _call(client, route, iterations)
+        query_count = len(queries)  # следующий запрос очистит журнал запросов (сигнал request_started)
+        client = prepare()
+        tracemalloc.start()
+        _call(client, route, iterations + 1)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        endpoints[route['name']] = {
+            'method': route['method'].upper(),
+            'path': route['path'],
+            'status': response.status_code,
+            'queries': query_count,
+            'p50_ms': round(_percentile(timings, 0.5), 3) if timings else None,
+            'p95_ms': round(_percentile(timings, 0.95), 3) if timings else None,
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+    return {
+        'database': connection.vendor,
+        'dataset': context['dataset'],
+        'iterations': iterations,
+        'endpoints': endpoints,
+        'unbenchmarked': sorted(url_names() - {route['name'] for route in routes(context)}),
+    }
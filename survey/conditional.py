@@ -0,0 +1,72 @@
+"""Условные GET-запросы (ETag, Last-Modified) по версии опросов: 304 без загрузки строк и сериализации"""
+import datetime
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import Survey
+
+
+def _day_start():
+    """Начало текущего дня: в этот момент is_open опросов может смениться без записи в БД"""
+    return datetime.datetime.combine(timezone.now().date(), datetime.time.min, tzinfo=datetime.timezone.utc)
+
+
+def _updated_at(survey_id):
+    try:
+        return Survey.objects.filter(pk=survey_id).values_list('updated_at', flat=True).first()
+    except (TypeError, ValueError):
+        return None
+
+
+def survey_list_stamp(**kwargs):
+    """Версия списка опросов: число опросов и время последнего изменения"""
+    stamp = Survey.objects.aggregate(count=Count('id'), last=Max('updated_at'))
+    last = stamp['last'].timestamp() if stamp['last'] else 0
+    # Без Last-Modified: удаление опроса не сдвигает Max(updated_at), его замечает только число в ETag
+    return f"surveys-{stamp['count']}-{last}-{timezone.now().date()}", None
+
+
+def survey_stamp(pk=None, survey_id=None, **kwargs):
+    """Версия опроса вместе с is_open: меняется при записи и в начале нового дня"""
+    survey_id = survey_id or pk
+    updated_at = _updated_at(survey_id)
+    if updated_at is None:
+        return None
+    return f"survey-{survey_id}-{updated_at.timestamp()}-{timezone.now().date()}", max(updated_at, _day_start())
+
+
+def survey_questions_stamp(survey_id, **kwargs):
+    """Версия вопросов опроса: меняется при записи в опрос, его вопросы или варианты"""
+    updated_at = _updated_at(survey_id)
+    if updated_at is None:
+        return None
+    return f"survey-{survey_id}-questions-{updated_at.timestamp()}", updated_at
+
+
+def conditional(stamp_func):
+    """Декоратор метода DRF-представления: 304 по If-None-Match/If-Modified-Since, иначе ответ с ETag и Last-Modified"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            stamp = stamp_func(**kwargs) if request.method in ('GET', 'HEAD') else None
+            if stamp is None:
+                return method(view, request, *args, **kwargs)
+            tag, last_modified = stamp
+            # Разные представления (JSON, browsable API) — разные ETag
+            etag = quote_etag(f'{tag}-{request.accepted_renderer.format}')
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if not_modified is not None:
+                return not_modified
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+            return response
+        return wrapper
+    return decorator
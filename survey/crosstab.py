@@ -0,0 +1,122 @@
+"""Таблицы сопряжённости двух вопросов с выбором: подсчёт пар одним самосоединением, маргиналы и хи-квадрат"""
+import hashlib
+import math
+
+from django.core.cache import cache
+from django.db import connection
+
+from . import tallies
+
+CACHE_TIMEOUT = 600
+
+
+def pair_counts(row_question_id, col_question_id):
+    """{(вариант строки, вариант столбца): число} — пары ответов одного респондента, одним GROUP BY"""
+    # Соединение идёт по индексу (user, question); строки ответов в Python не загружаются
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT r.selected_option_id, c.selected_option_id, COUNT(*) "
+            "FROM survey_userresponse r JOIN survey_userresponse c "
+            "ON c.user_id = r.user_id AND c.question_id = %s "
+            "WHERE r.question_id = %s AND r.selected_option_id IS NOT NULL AND c.selected_option_id IS NOT NULL "
+            "GROUP BY r.selected_option_id, c.selected_option_id",
+            [col_question_id, row_question_id],
+        )
+        return {(row_option, col_option): count for row_option, col_option, count in cursor.fetchall()}
+
+
+def _chi2_sf(statistic, dof):
+    """P(χ² ≥ statistic): регуляризованная верхняя неполная гамма-функция Q(dof/2, statistic/2)"""
+    a, x = dof / 2, statistic / 2
+    if x <= 0:
+        return 1.0
+    log_prefactor = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Ряд для нижней функции P(a, x)
+        term = total = 1 / a
+        n = a
+        for _ in range(1000):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return max(0.0, 1 - total * math.exp(log_prefactor))
+    # Цепная дробь для Q(a, x), метод Лентца
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1 / (d if abs(d) > tiny else tiny)
+        c = b + an / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return h * math.exp(log_prefactor)
+
+
+def chi_square(table, row_totals, col_totals, total):
+    """Критерий независимости хи-квадрат и V Крамера; пустые строки и столбцы не учитываются"""
+    rows = [i for i, value in enumerate(row_totals) if value]
+    cols = [j for j, value in enumerate(col_totals) if value]
+    dof = (len(rows) - 1) * (len(cols) - 1)
+    if dof <= 0:
+        return None
+    statistic = 0.0
+    for i in rows:
+        for j in cols:
+            expected = row_totals[i] * col_totals[j] / total
+            statistic += (table[i][j] - expected) ** 2 / expected
+    return {
+        'statistic': round(statistic, 6),
+        'dof': dof,
+        'p_value': round(_chi2_sf(statistic, dof), 6),
+        'cramers_v': round(math.sqrt(statistic / (total * (min(len(rows), len(cols)) - 1))), 6),
+    }
+
+
+def build(row_question, col_question, options_by_question):
+    """Таблица, маргиналы и хи-квадрат по вариантам ответа двух вопросов (в порядке id)"""
+    row_options = options_by_question.get(row_question.id, [])
+    col_options = options_by_question.get(col_question.id, [])
+    counts = pair_counts(row_question.id, col_question.id)
+    table = [[counts.get((row.id, col.id), 0) for col in col_options] for row in row_options]
+    row_totals = [sum(line) for line in table]
+    col_totals = [sum(column) for column in zip(*table)] if table else [0] * len(col_options)
+    total = sum(row_totals)
+    return {
+        'row': {'id': row_question.id, 'text': row_question.text},
+        'col': {'id': col_question.id, 'text': col_question.text},
+        'row_options': [{'id': option.id, 'text': option.text} for option in row_options],
+        'col_options': [{'id': option.id, 'text': option.text} for option in col_options],
+        'table': table,
+        'row_totals': row_totals,
+        'col_totals': col_totals,
+        'total': total,
+        'chi_square': chi_square(table, row_totals, col_totals, total) if total else None,
+    }
+
+
+def cache_key(survey, row_question, col_question, options_by_question):
+    """Версия таблицы: версия опроса и счётчики вариантов обоих вопросов (меняются при любом ответе)"""
+    # Изменения, не затрагивающие счётчики (удаление респондента), видны по истечении CACHE_TIMEOUT
+    counts = [(option.id, tallies.tally_value(option, 'count'))
+              for question in (row_question, col_question) for option in options_by_question.get(question.id, [])]
+    digest = hashlib.md5(repr(counts).encode()).hexdigest()
+    return f'survey:{survey.id}:crosstab:{row_question.id}:{col_question.id}:{survey.updated_at.timestamp()}:{digest}'
+
+
+def crosstab(survey, row_question, col_question, options_by_question):
+    """Таблица сопряжённости из кэша; при промахе — один запрос подсчёта пар"""
+    key = cache_key(survey, row_question, col_question, options_by_question)
+    result = cache.get(key)
+    if result is None:
+        result = build(row_question, col_question, options_by_question)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,35 @@
+"""Описание опроса одним вложенным документом: сборка за фиксированное число запросов и кэш готовых байтов"""
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Question, AnswerOption
+from .serializers import SurveyDefinitionSerializer
+
+CACHE_TIMEOUT = 86400
+
+
+def definition_key(survey):
+    """Ключ кэша: версия опроса (updated_at) и дата — is_open зависит от текущего дня"""
+    return f'survey:{survey.id}:definition:{survey.updated_at.timestamp()}:{timezone.now().date().isoformat()}'
+
+
+def build_definition(survey):
+    """Сериализует опрос с вопросами и вариантами: два запроса на любое число вопросов"""
+    prefetch_related_objects(
+        [survey],
+        Prefetch('questions', queryset=Question.objects.order_by('id')),
+        Prefetch('questions__options', queryset=AnswerOption.objects.order_by('id')),
+    )
+    return JSONRenderer().render(SurveyDefinitionSerializer(survey).data)
+
+
+def definition_bytes(survey):
+    """Готовый JSON описания из кэша; собирается заново после любого изменения опроса"""
+    key = definition_key(survey)
+    content = cache.get(key)
+    if content is None:
+        content = build_definition(survey)
+        cache.set(key, content, CACHE_TIMEOUT)
+    return content
@@ -0,0 +1,47 @@
+"""Потоковая выгрузка ответов на опрос в CSV и NDJSON"""
+import csv
+import json
+from itertools import islice
+
+from .models import UserResponse
+
+EXPORT_FIELDS = ['id', 'user_id', 'question_id', 'question', 'option_id', 'option', 'text_response']
+CHUNK_SIZE = 2000
+
+
+def export_rows(survey_id, chunk_size=CHUNK_SIZE):
+    """Строки ответов с текстами вопросов и вариантов, присоединёнными в SQL, порциями из курсора"""
+    return (UserResponse.objects.filter(question__survey_id=survey_id).order_by('id')
+            .values_list('id', 'user_id', 'question_id', 'question__text',
+                         'selected_option_id', 'selected_option__text', 'text_response')
+            .iterator(chunk_size=chunk_size))
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+    def write(self, value):
+        return value
+
+
+def _batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def iter_csv(rows, batch_size=500):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for batch in _batched(rows, batch_size):
+        yield ''.join(writer.writerow(row) for row in batch)
+
+
+def iter_ndjson(rows, batch_size=500):
+    for batch in _batched(rows, batch_size):
+        yield ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n' for row in batch)
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,192 @@
+"""Буферизованный приём ответов: журнал на диске и перенос в UserResponse большими пачками (INGESTION_MODE=buffered)"""
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Question, AnswerOption, UserResponse, Submission, IngestCheckpoint
+from . import tallies
+
+try:
+    import fcntl
+except ImportError:  # Windows: без блокировки, дозапись через O_APPEND
+    fcntl = None
+
+logger = logging.getLogger('survey.ingest')
+
+SEGMENT_PREFIX = 'responses-'
+SEGMENT_SUFFIX = '.jsonl'
+FLUSH_BATCH_SIZE = 5000
+# Полностью перенесённые сегменты старше стольких часов удаляются вместе с их отметками
+RETENTION_HOURS = 2
+
+
+def is_buffered():
+    """Включён ли буферизованный режим приёма ответов"""
+    return getattr(settings, 'INGESTION_MODE', 'direct') == 'buffered'
+
+
+def spool_dir():
+    return Path(settings.INGESTION_SPOOL_DIR)
+
+
+def segment_name(moment):
+    """Сегмент журнала на каждый час: имена упорядочены так же, как время"""
+    return f'{SEGMENT_PREFIX}{moment:%Y%m%d%H}{SEGMENT_SUFFIX}'
+
+
+def segments():
+    return sorted(spool_dir().glob(f'{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}'))
+
+
+def enqueue(responses):
+    """Дописывает ответы одной отправки строкой JSON в текущий сегмент; возвращает управление после fsync"""
+    record = {
+        'queued_at': time.time(),
+        'responses': [[r.question_id, r.selected_option_id, r.text_response, r.user_id] for r in responses],
+    }
+    line = (json.dumps(record, ensure_ascii=False) + '\n').encode()
+    directory = spool_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    fd = os.open(directory / segment_name(timezone.now()), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b'\n':
+                line = b'\n' + line  # хвост записи, оборванной при сбое, не должен склеиться с новой строкой
+        while line:
+            line = line[os.write(fd, line):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_records(path, offset, limit):
+    """Завершённые строки сегмента начиная с offset: (записи, смещение после последней из них)"""
+    records = []
+    with open(path, 'rb') as spool:
+        spool.seek(offset)
+        while len(records) < limit:
+            line = spool.readline()
+            if not line.endswith(b'\n'):
+                break  # строка ещё дописывается
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(json.dumps({'segment': path.name, 'skipped': 'broken record'}))
+    return records, offset
+
+
+def _to_submissions(records):
+    """[((опрос, пользователь), ответы)] по записям журнала; ответы на удалённые вопросы и варианты отбрасываются"""
+    rows = [row for record in records for row in record['responses']]
+    survey_ids = dict(Question.objects.filter(id__in={row[0] for row in rows}).values_list('id', 'survey_id'))
+    option_ids = set(AnswerOption.objects.filter(id__in={row[1] for row in rows if row[1]})
+                     .values_list('id', flat=True))
+    # Пользователь мог быть удалён, пока отправка ждала в буфере: ответы остаются без автора, как при SET_NULL
+    user_ids = set(User.objects.filter(id__in={row[3] for row in rows if row[3]}).values_list('id', flat=True))
+    submissions = []
+    for record in records:
+        # Время ответа — момент постановки в буфер, а не переноса: динамика не сдвигается на задержку обработчика
+        submitted_at = datetime.fromtimestamp(record['queued_at'], dt_timezone.utc)
+        responses = [
+            UserResponse(question_id=question_id, survey_id=survey_ids.get(question_id), selected_option_id=option_id,
+                         text_response=text, user_id=user_id if user_id in user_ids else None,
+                         submitted_at=submitted_at)
+            for question_id, option_id, text, user_id in record['responses']
+            if question_id in survey_ids and (option_id is None or option_id in option_ids)
+        ]
+        if responses:
+            submissions.append(((survey_ids[responses[0].question_id], responses[0].user_id), responses))
+    return submissions
+
+
+def _link_submissions(submissions):
+    """Заводит заголовки отправок; повторные отправки (опрос, пользователь) отбрасываются: (ответы, число повторов)"""
+    # user_id уже сверен с auth_user в _to_submissions: заголовки заводятся только для существующих пользователей
+    users = {user_id for (_, user_id), _ in submissions if user_id is not None}
+    taken = set(Submission.objects.filter(survey_id__in={survey_id for (survey_id, _), _ in submissions},
+                                          user_id__in=users).values_list('survey_id', 'user_id'))
+    headers = []
+    accepted = []
+    duplicates = 0
+    for (survey_id, user_id), responses in submissions:
+        if user_id is not None:
+            if (survey_id, user_id) in taken:
+                duplicates += 1
+                continue
+            taken.add((survey_id, user_id))
+            header = Submission(survey_id=survey_id, user_id=user_id, created_at=responses[0].submitted_at)
+            headers.append(header)
+            for response in responses:
+                response.submission = header
+        accepted.extend(responses)
+    Submission.objects.bulk_create(headers, batch_size=1000)
+    return accepted, duplicates
+
+
+def flush_segment(path, batch_size=FLUSH_BATCH_SIZE):
+    """Переносит новые записи сегмента; вставка и сдвиг отметки в одной транзакции — ровно один раз"""
+    checkpoint, _ = IngestCheckpoint.objects.get_or_create(segment=path.name)
+    offset = checkpoint.offset
+    flushed = 0
+    while True:
+        records, new_offset = _read_records(path, offset, batch_size)
+        if new_offset == offset:
+            return flushed
+        submissions = _to_submissions(records)
+        with transaction.atomic():
+            # Сравнение со старым смещением: параллельный обработчик не вставит ту же часть повторно
+            if not IngestCheckpoint.objects.filter(pk=checkpoint.pk, offset=offset).update(offset=new_offset):
+                return flushed
+            responses, duplicates = _link_submissions(submissions)
+            tallies.record_responses(UserResponse.objects.bulk_create(responses, batch_size=1000))
+        if records:
+            lag = time.time() - min(record['queued_at'] for record in records)
+            logger.info(json.dumps({'segment': path.name, 'submissions': len(records), 'duplicates': duplicates,
+                                    'responses': len(responses), 'flush_lag_s': round(lag, 3)}))
+        flushed += len(responses)
+        offset = new_offset
+
+
+def flush(batch_size=FLUSH_BATCH_SIZE):
+    """Переносит все сегменты и удаляет старые перенесённые; возвращает число вставленных ответов"""
+    flushed = 0
+    oldest_kept = segment_name(timezone.now() - timedelta(hours=RETENTION_HOURS))
+    for path in segments():
+        flushed += flush_segment(path, batch_size)
+        if path.name < oldest_kept and IngestCheckpoint.objects.filter(
+                segment=path.name, offset=path.stat().st_size).exists():
+            path.unlink()
+    IngestCheckpoint.objects.filter(segment__lt=oldest_kept).exclude(
+        segment__in=[path.name for path in segments()]).delete()
+    return flushed
+
+
+def stats():
+    """Метрики буфера: ещё не перенесённые байты и задержка переноса — возраст самой старой ждущей отправки"""
+    offsets = dict(IngestCheckpoint.objects.values_list('segment', 'offset'))
+    pending_bytes = 0
+    lag = 0.0
+    for path in segments():
+        offset = offsets.get(path.name, 0)
+        pending = path.stat().st_size - offset
+        if pending <= 0:
+            continue
+        if not pending_bytes:
+            records, _ = _read_records(path, offset, 1)
+            if records:
+                lag = time.time() - records[0]['queued_at']
+        pending_bytes += pending
+    return {'pending_bytes': pending_bytes, 'flush_lag_s': round(lag, 3)}
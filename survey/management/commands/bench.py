@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from survey import bench
+
+
+class Command(BaseCommand):
+    help = ("Заполняет отдельную тестовую БД синтетическими данными, прогоняет все маршруты survey/urls.py "
+            "и выводит JSON с числом запросов, p50/p95 задержки и пиком памяти по каждому эндпоинту")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--surveys', type=int, default=5)
+        parser.add_argument('--questions', type=int, default=10, help="Вопросов в каждом опросе")
+        parser.add_argument('--options', type=int, default=4, help="Вариантов в каждом вопросе с выбором")
+        parser.add_argument('--responses', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', action='append', help="Замерить только указанный маршрут (можно несколько раз)")
+        parser.add_argument('--output', help="Путь к JSON-файлу; по умолчанию stdout")
+        parser.add_argument('--profiles', help="Профили БД через запятую, например sqlite,postgres: "
+                                               "каждый прогоняется в отдельном процессе с DB_PROFILE")
+        parser.add_argument('--with-tests', action='store_true',
+                            help="Вместе с --profiles: перед замерами прогнать тесты на каждом профиле")
+
+    def handle(self, *args, **options):
+        if options['profiles']:
+            report = {profile: self.run_profile(profile, options) for profile in options['profiles'].split(',')}
+        else:
+            report = self.run_bench(options)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run_profile(self, profile, options):
+        """Тесты и замеры в дочернем процессе: профиль БД задаётся при загрузке настроек"""
+        env = {**os.environ, 'DB_PROFILE': profile}
+        result = {}
+        if options['with_tests']:
+            tests = subprocess.run([sys.executable, '-m', 'django', 'test', 'survey', '--noinput'],
+                                   env=env, capture_output=True, text=True)
+            result['tests'] = 'passed' if tests.returncode == 0 else 'failed'
+            if tests.returncode:
+                result['tests_output'] = tests.stderr[-2000:]
+        args = [f'--{name}={options[name]}' for name in ('surveys', 'questions', 'options', 'responses',
+                                                          'users', 'iterations', 'seed')]
+        args += [f'--only={name}' for name in options['only'] or []]
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            bench_run = subprocess.run([sys.executable, '-m', 'django', 'bench', *args, f'--output={output}'],
+                                       env=env, capture_output=True, text=True)
+            if bench_run.returncode:
+                result['error'] = bench_run.stderr[-2000:]
+            else:
+                with open(output, encoding='utf-8') as f:
+                    result.update(json.load(f))
+        return result
+
+    def run_bench(self, options):
+        setup_test_environment(debug=False)  # замеры без накладных расходов DEBUG
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            context = bench.seed(surveys=options['surveys'], questions=options['questions'],
+                                 options=options['options'], responses=options['responses'],
+                                 users=options['users'], seed=options['seed'])
+            report = bench.run(context, iterations=options['iterations'], names=options['only'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        return {'profile': settings.DB_PROFILE, **report}
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from survey.models import Survey
+
+
+class Command(BaseCommand):
+    help = "Снимает флаг is_active с опросов, у которых прошла дата окончания (запускать раз в сутки)"
+
+    def handle(self, *args, **options):
+        expired = Survey.objects.expire_overdue()
+        self.stdout.write(self.style.SUCCESS(f"Завершено опросов: {expired}"))
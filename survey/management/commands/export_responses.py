@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from survey import exports
+from survey.models import Survey
+
+
+class Command(BaseCommand):
+    help = "Потоково выгружает ответы на опрос в CSV или NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_id', type=int)
+        parser.add_argument('--type', choices=sorted(exports.FORMATS), default='csv', dest='export_type')
+        parser.add_argument('--output', help="Путь к файлу; по умолчанию stdout")
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if not Survey.objects.filter(id=options['survey_id']).exists():
+            raise CommandError(f"Опрос {options['survey_id']} не найден")
+        render_rows, _ = exports.FORMATS[options['export_type']]
+        rows = exports.export_rows(options['survey_id'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(render_rows(rows))
+        else:
+            for chunk in render_rows(rows):
+                self.stdout.write(chunk, ending='')
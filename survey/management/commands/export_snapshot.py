@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from survey import snapshots
+from survey.models import Survey
+
+
+class Command(BaseCommand):
+    help = "Выгружает ответы на опрос колоночным снимком (.npy + labels.json) для NumPy/pandas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('survey_id', type=int)
+        parser.add_argument('--output', help="Каталог снимка; по умолчанию survey-<id>-snapshot")
+        parser.add_argument('--archive', help="Дополнительно упаковать снимок в один файл .npz")
+        parser.add_argument('--chunk-size', type=int, default=snapshots.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        survey = Survey.objects.filter(id=options['survey_id']).first()
+        if survey is None:
+            raise CommandError(f"Опрос {options['survey_id']} не найден")
+        directory = options['output'] or f'survey-{survey.id}-snapshot'
+        labels = snapshots.write_snapshot(survey, directory, chunk_size=options['chunk_size'])
+        if options['archive']:
+            snapshots.write_archive(directory, options['archive'])
+        self.stdout.write(self.style.SUCCESS(f"Снимок записан в {directory}: ответов {labels['rows']}"))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from survey import ingest
+
+
+class Command(BaseCommand):
+    help = "Переносит ответы из буфера на диске в БД (режим INGESTION_MODE=buffered)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Один проход и выход (например, из cron)")
+        parser.add_argument('--interval', type=float, default=1.0, help="Пауза между проходами, секунды")
+        parser.add_argument('--batch-size', type=int, default=ingest.FLUSH_BATCH_SIZE,
+                            help="Сколько отправок переносить одной транзакцией")
+        parser.add_argument('--status', action='store_true', help="Только показать размер буфера и задержку переноса")
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.write_stats()
+            return
+        while True:
+            flushed = ingest.flush(options['batch_size'])
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f"Перенесено ответов: {flushed}"))
+                self.write_stats()
+                return
+            time.sleep(options['interval'])
+
+    def write_stats(self):
+        stats = ingest.stats()
+        self.stdout.write(f"В буфере: {stats['pending_bytes']} байт, задержка переноса: {stats['flush_lag_s']} с")
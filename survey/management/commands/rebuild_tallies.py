@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from survey import tallies
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает материализованные счётчики ответов по таблице UserResponse"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey', type=int, action='append', dest='surveys',
+                            help="ID опроса (можно указать несколько раз); по умолчанию все опросы")
+
+    def handle(self, *args, **options):
+        questions, answer_options = tallies.rebuild(options['surveys'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Счётчики перестроены: вопросов {questions}, вариантов ответа {answer_options}"
+        ))
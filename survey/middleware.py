@@ -0,0 +1,48 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger('survey.db')
+
+
+class QueryStats:
+    """Обёртка execute_wrapper: считает SQL-запросы и суммарное время в БД"""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class QueryCountMiddleware:
+    """Число SQL-запросов и время в БД в заголовках ответа и логе (настройка QUERY_INSTRUMENTATION)"""
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        db_time_ms = round(stats.duration * 1000, 3)
+        response['X-DB-Query-Count'] = str(stats.count)
+        response['X-DB-Time-Ms'] = str(db_time_ms)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_time_ms': db_time_ms,
+        }))
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_tallies(apps, schema_editor):
+    Question = apps.get_model('survey', 'Question')
+    AnswerOption = apps.get_model('survey', 'AnswerOption')
+    UserResponse = apps.get_model('survey', 'UserResponse')
+    QuestionTally = apps.get_model('survey', 'QuestionTally')
+    OptionTally = apps.get_model('survey', 'OptionTally')
+    question_counts = dict(UserResponse.objects.values_list('question_id').annotate(n=Count('id')).order_by())
+    option_counts = dict(
+        UserResponse.objects.filter(selected_option__isnull=False)
+        .values_list('selected_option_id').annotate(n=Count('id')).order_by()
+    )
+    QuestionTally.objects.bulk_create([
+        QuestionTally(survey_id=survey_id, question_id=pk, responses=question_counts.get(pk, 0))
+        for pk, survey_id in Question.objects.values_list('id', 'survey_id')
+    ], batch_size=1000)
+    OptionTally.objects.bulk_create([
+        OptionTally(survey_id=survey_id, question_id=question_id, option_id=pk, count=option_counts.get(pk, 0))
+        for pk, question_id, survey_id in AnswerOption.objects.values_list('id', 'question_id', 'question__survey_id')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OptionTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('option', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tally', to='survey.answeroption')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='option_tallies', to='survey.question')),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='option_tallies', to='survey.survey')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tally', to='survey.question')),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_tallies', to='survey.survey')),
+            ],
+        ),
+        migrations.RunPython(backfill_tallies, migrations.RunPython.noop),
+    ]
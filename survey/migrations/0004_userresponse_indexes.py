@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0003_survey_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userresponse',
+            index=models.Index(fields=['question', 'selected_option'], name='response_question_option_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userresponse',
+            index=models.Index(fields=['user', 'question'], name='response_user_question_idx'),
+        ),
+    ]
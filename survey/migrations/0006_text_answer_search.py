@@ -0,0 +1,63 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    # Внешнее содержимое: текст хранится только в survey_userresponse, индекс — в FTS5
+    """CREATE VIRTUAL TABLE survey_response_fts USING fts5(
+        text_response, content='survey_userresponse', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER survey_response_fts_insert AFTER INSERT ON survey_userresponse
+        WHEN new.text_response IS NOT NULL BEGIN
+        INSERT INTO survey_response_fts(rowid, text_response) VALUES (new.id, new.text_response);
+    END""",
+    """CREATE TRIGGER survey_response_fts_delete AFTER DELETE ON survey_userresponse
+        WHEN old.text_response IS NOT NULL BEGIN
+        INSERT INTO survey_response_fts(survey_response_fts, rowid, text_response)
+        VALUES ('delete', old.id, old.text_response);
+    END""",
+    """CREATE TRIGGER survey_response_fts_update AFTER UPDATE OF text_response ON survey_userresponse BEGIN
+        INSERT INTO survey_response_fts(survey_response_fts, rowid, text_response)
+        SELECT 'delete', old.id, old.text_response WHERE old.text_response IS NOT NULL;
+        INSERT INTO survey_response_fts(rowid, text_response)
+        SELECT new.id, new.text_response WHERE new.text_response IS NOT NULL;
+    END""",
+    "INSERT INTO survey_response_fts(survey_response_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS survey_response_fts_update",
+    "DROP TRIGGER IF EXISTS survey_response_fts_delete",
+    "DROP TRIGGER IF EXISTS survey_response_fts_insert",
+    "DROP TABLE IF EXISTS survey_response_fts",
+]
+
+# Индекс по выражению: PostgreSQL сам поддерживает его при любой записи, запросы повторяют выражение дословно
+POSTGRES_FORWARD = [
+    """CREATE INDEX survey_response_text_search ON survey_userresponse
+        USING GIN (to_tsvector('russian', COALESCE(text_response, '')))""",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS survey_response_text_search",
+]
+
+
+def run(statements_by_vendor):
+    def apply(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0005_ingest_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
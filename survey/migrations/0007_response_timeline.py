@@ -0,0 +1,83 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:30
+
+import importlib
+from datetime import datetime, time, timezone as dt_timezone
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Trunc
+
+search_migration = importlib.import_module('survey.migrations.0006_text_answer_search')
+
+
+def backfill_submitted_at(apps, schema_editor):
+    # Время старых ответов не сохранялось: ближайшая известная оценка — начало опроса (полночь UTC)
+    Survey = apps.get_model('survey', 'Survey')
+    UserResponse = apps.get_model('survey', 'UserResponse')
+    for survey_id, start_date in Survey.objects.values_list('id', 'start_date'):
+        UserResponse.objects.filter(question__survey_id=survey_id, submitted_at__isnull=True).update(
+            submitted_at=datetime.combine(start_date, time.min, tzinfo=dt_timezone.utc))
+
+
+def backfill_rollups(apps, schema_editor):
+    UserResponse = apps.get_model('survey', 'UserResponse')
+    ResponseRollup = apps.get_model('survey', 'ResponseRollup')
+    for granularity in ('minute', 'hour', 'day'):
+        grouped = (
+            UserResponse.objects.annotate(bucket=Trunc('submitted_at', granularity, tzinfo=dt_timezone.utc))
+            .values_list('question__survey_id', 'question_id', 'bucket').annotate(n=Count('id')).order_by()
+        )
+        ResponseRollup.objects.bulk_create([
+            ResponseRollup(survey_id=survey_id, question_id=question_id, granularity=granularity, bucket=bucket, count=n)
+            for survey_id, question_id, bucket, n in grouped
+        ], batch_size=1000)
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite меняет NOT NULL пересозданием таблицы ответов, а вместе со старой таблицей удаляются
+    # триггеры полнотекстового индекса из 0006; id строк при копировании сохраняются, индекс остаётся верным
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in search_migration.SQLITE_FORWARD[1:4]:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0006_text_answer_search'),
+    ]
+
+    operations = [
+        # При откате пересоздание таблицы тоже теряет триггеры: восстанавливаются последним шагом отката
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='userresponse',
+            name='submitted_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_submitted_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='userresponse',
+            name='submitted_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ResponseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'minute'), ('hour', 'hour'), ('day', 'day')], max_length=6)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='survey.question')),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='survey.survey')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['survey', 'granularity', 'bucket'], name='rollup_survey_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('question', 'granularity', 'bucket'), name='rollup_question_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:41
+
+import importlib
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+timeline_migration = importlib.import_module('survey.migrations.0007_response_timeline')
+
+
+def backfill_submissions(apps, schema_editor):
+    # Все ответы пользователя на опрос сводятся в одну отправку со временем первого ответа;
+    # ответы без пользователя (удалённые аккаунты) остаются без заголовка
+    Survey = apps.get_model('survey', 'Survey')
+    Submission = apps.get_model('survey', 'Submission')
+    UserResponse = apps.get_model('survey', 'UserResponse')
+    responses = UserResponse.objects.filter(user__isnull=False)
+    Submission.objects.bulk_create([
+        Submission(survey_id=survey_id, user_id=user_id, created_at=first)
+        for survey_id, user_id, first in responses.values_list('question__survey_id', 'user_id')
+        .annotate(first=Min('submitted_at')).order_by()
+    ], batch_size=1000)
+    for survey_id in Survey.objects.values_list('id', flat=True):
+        responses.filter(question__survey_id=survey_id).update(submission=Subquery(
+            Submission.objects.filter(survey_id=survey_id, user_id=OuterRef('user_id')).values('id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0007_response_timeline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Откат удаляет колонку пересозданием таблицы ответов (SQLite) — триггеры поиска восстанавливаются
+        migrations.RunPython(migrations.RunPython.noop, timeline_migration.restore_search_triggers),
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='survey.survey')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='submissions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userresponse',
+            name='submission',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='survey.submission'),
+        ),
+        migrations.AddConstraint(
+            model_name='submission',
+            constraint=models.UniqueConstraint(fields=('survey', 'user'), name='submission_survey_user_uniq'),
+        ),
+        migrations.RunPython(backfill_submissions, migrations.RunPython.noop),
+    ]
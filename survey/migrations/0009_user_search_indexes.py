@@ -0,0 +1,38 @@
+import importlib
+
+from django.db import migrations
+
+search_migration = importlib.import_module('survey.migrations.0006_text_answer_search')
+
+# Функциональные индексы для поиска пользователей без учёта регистра (survey.users.matching):
+# запрос сравнивает lower(username) и lower(email) дословно тем же выражением, что и в индексе
+SQLITE_FORWARD = [
+    "CREATE INDEX survey_user_username_lower ON auth_user (lower(username))",
+    "CREATE INDEX survey_user_email_lower ON auth_user (lower(email))",
+]
+
+# text_pattern_ops: LIKE 'prefix%' идёт по индексу и сравнивает побайтово при любой сортировке базы
+POSTGRES_FORWARD = [
+    "CREATE INDEX survey_user_username_lower ON auth_user (lower(username) text_pattern_ops)",
+    "CREATE INDEX survey_user_email_lower ON auth_user (lower(email) text_pattern_ops)",
+]
+
+BACKWARD = [
+    "DROP INDEX IF EXISTS survey_user_email_lower",
+    "DROP INDEX IF EXISTS survey_user_username_lower",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0008_submission'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            search_migration.run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            search_migration.run({'sqlite': BACKWARD, 'postgresql': BACKWARD}),
+        ),
+    ]
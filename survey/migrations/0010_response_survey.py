@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:25
+
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+timeline_migration = importlib.import_module('survey.migrations.0007_response_timeline')
+
+
+def backfill_survey(apps, schema_editor):
+    Question = apps.get_model('survey', 'Question')
+    UserResponse = apps.get_model('survey', 'UserResponse')
+    UserResponse.objects.update(
+        survey=Subquery(Question.objects.filter(id=OuterRef('question_id')).values('survey_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0009_user_search_indexes'),
+    ]
+
+    operations = [
+        # Откат удаляет колонку пересозданием таблицы ответов (SQLite) — триггеры поиска восстанавливаются
+        migrations.RunPython(migrations.RunPython.noop, timeline_migration.restore_search_triggers),
+        migrations.AddField(
+            model_name='userresponse',
+            name='survey',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='survey.survey'),
+        ),
+        migrations.RunPython(backfill_survey, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='userresponse',
+            index=models.Index(fields=['survey', 'id'], name='response_survey_id_idx'),
+        ),
+    ]
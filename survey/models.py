@@ -1,22 +1,112 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 
-class Survey(models.Model):
+class TrackedModel(models.Model):
+    """Запоминает значения полей при загрузке из БД: save() пишет только изменённые колонки"""
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def _snapshot(self, field_names=None):
+        # После частичного сохранения или перезагрузки запоминаются только затронутые поля:
+        # остальные несохранённые изменения должны остаться «грязными»
+        if field_names is None:
+            fields, loaded = self._meta.concrete_fields, {}
+        else:
+            fields = [field for field in map(self._meta.get_field, field_names) if field.concrete]
+            loaded = getattr(self, '_loaded_values', {})
+        loaded.update({
+            field.attname: self.__dict__[field.attname] for field in fields if field.attname in self.__dict__
+        })
+        self._loaded_values = loaded
+
+    def is_tracked(self, field_name):
+        """Известно ли исходное значение поля (объект загружен из БД и поле не отложено)"""
+        return self._meta.get_field(field_name).attname in getattr(self, '_loaded_values', {})
+
+    def get_original(self, field_name):
+        """Значение поля на момент загрузки из БД или последнего сохранения"""
+        return self._loaded_values[self._meta.get_field(field_name).attname]
+
+    def get_dirty_fields(self):
+        """Имена полей, изменённых с момента загрузки или последнего сохранения"""
+        loaded = getattr(self, '_loaded_values', {})
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname in self.__dict__
+            and (field.attname not in loaded or loaded[field.attname] != self.__dict__[field.attname])
+        ]
+
+    def save(self, *args, **kwargs):
+        tracked_update = (not self._state.adding and hasattr(self, '_loaded_values')
+                          and kwargs.get('update_fields') is None and not kwargs.get('force_insert'))
+        if tracked_update:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            auto_now = [field.name for field in self._meta.concrete_fields if getattr(field, 'auto_now', False)]
+            kwargs['update_fields'] = set(dirty) | set(auto_now)
+        super().save(*args, **kwargs)
+        self._snapshot(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        self._snapshot(fields)
+
+
+class SurveyQuerySet(models.QuerySet):
+    def with_status(self):
+        """Добавляет is_open: опрос активен и дата окончания ещё не прошла"""
+        today = timezone.now().date()
+        return self.annotate(is_open=models.ExpressionWrapper(
+            models.Q(is_active=True, end_date__gte=today), output_field=models.BooleanField()
+        ))
+
+    def touch(self):
+        """Отмечает изменение содержимого опросов, не трогая остальные поля"""
+        return self.update(updated_at=timezone.now())
+
+    def with_respondents(self):
+        """Добавляет respondents: число отправок опроса по таблице Submission (по индексу survey, user)"""
+        submissions = (Submission.objects.filter(survey=models.OuterRef('pk')).order_by()
+                       .values('survey').annotate(n=models.Count('id')).values('n'))
+        return self.annotate(respondents=Coalesce(models.Subquery(submissions), 0))
+
+    def expire_overdue(self):
+        """Одним UPDATE снимает флаг is_active с опросов, у которых истёк end_date"""
+        return self.filter(is_active=True, end_date__lt=timezone.now().date()).update(
+            is_active=False, updated_at=timezone.now())
+
+
+class Survey(TrackedModel):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     start_date = models.DateField()
     end_date = models.DateField()
     is_active = models.BooleanField(default=True)
+    # Меняется при любом изменении опроса, его вопросов или вариантов ответа
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SurveyQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
         # Не даем менять start_date после создания
         if self.pk is not None:
-            orig = Survey.objects.get(pk=self.pk)
-            if orig.start_date != self.start_date:
-                self.start_date = orig.start_date
+            if self.is_tracked('start_date'):
+                self.start_date = self.get_original('start_date')
+            else:
+                stored = Survey.objects.filter(pk=self.pk).values_list('start_date', flat=True).first()
+                self.start_date = stored or self.start_date
         super().save(*args, **kwargs)
 
     # Проверка чтобы end_date должен быть позже start_date
@@ -26,16 +116,17 @@ class Survey(models.Model):
 
     def update_status(self):
         """Обновляет is_active на False, если end_date истёк"""
-        if self.end_date < timezone.now().date():
+        if self.is_active and self.end_date < timezone.now().date():
             self.is_active = False
-            self.save()
+            self.updated_at = timezone.now()
+            Survey.objects.filter(pk=self.pk).update(is_active=False, updated_at=self.updated_at)
 
     def __str__(self):
         return self.title
 
 
 
-class Question(models.Model):
+class Question(TrackedModel):
     survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='questions')
     text = models.CharField(max_length=255)
     question_type = models.CharField(max_length=50, choices=[
@@ -48,18 +139,127 @@ class Question(models.Model):
         return self.text
 
 
-class AnswerOption(models.Model):
+class AnswerOption(TrackedModel):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='options')
     text = models.CharField(max_length=255)
 
     def __str__(self):
         return self.text
 
+class Submission(models.Model):
+    """Заголовок отправки: один на пользователя и опрос, к нему привязаны строки ответов"""
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='submissions')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='submissions')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # Повторная отправка отсекается уникальным индексом; он же считает респондентов опроса
+            models.UniqueConstraint(fields=['survey', 'user'], name='submission_survey_user_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} → {self.survey_id}"
+
+
+class UserResponseQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Проставляет опрос ответам, у которых он не задан: из загруженного вопроса или одним запросом на пакет"""
+        objs = list(objs)
+        for obj in objs:
+            if obj.survey_id is None and UserResponse.question.is_cached(obj):
+                obj.survey_id = obj.question.survey_id
+        missing = {obj.question_id for obj in objs if obj.survey_id is None}
+        if missing:
+            surveys = dict(Question.objects.filter(id__in=missing).values_list('id', 'survey_id'))
+            for obj in objs:
+                if obj.survey_id is None:
+                    obj.survey_id = surveys.get(obj.question_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class UserResponse(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    # Копия question.survey: ответы опроса читаются по индексу (survey, id) сразу в порядке id
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, null=True, blank=True, db_index=False,
+                               related_name='responses')
     selected_option = models.ForeignKey(AnswerOption, on_delete=models.CASCADE, null=True, blank=True)
     text_response = models.TextField(null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    submitted_at = models.DateTimeField(default=timezone.now, db_index=True)
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, null=True, blank=True,
+                                   related_name='responses')
+
+    class Meta:
+        indexes = [
+            # Подсчёт ответов по вариантам внутри вопроса (статистика, пересчёт счётчиков)
+            models.Index(fields=['question', 'selected_option'], name='response_question_option_idx'),
+            # Ответы пользователя на конкретный вопрос
+            models.Index(fields=['user', 'question'], name='response_user_question_idx'),
+            # Курсорная выдача ответов опроса: страница читается по индексу без сортировки
+            models.Index(fields=['survey', 'id'], name='response_survey_id_idx'),
+        ]
+
+    objects = UserResponseQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        if self.survey_id is None:
+            self.survey_id = self.question.survey_id
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Response to {self.question.text}"
+
+class QuestionTally(models.Model):
+    """Материализованный счётчик ответов на вопрос"""
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='question_tallies')
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='tally')
+    responses = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.question.text}: {self.responses}"
+
+
+class OptionTally(models.Model):
+    """Материализованный счётчик выбора варианта ответа"""
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='option_tallies')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='option_tallies')
+    option = models.OneToOneField(AnswerOption, on_delete=models.CASCADE, related_name='tally')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.option.text}: {self.count}"
+
+
+class ResponseRollup(models.Model):
+    """Материализованное число ответов на вопрос за минуту, час или сутки (UTC)"""
+    GRANULARITIES = ('minute', 'hour', 'day')
+
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='rollups')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='rollups')
+    granularity = models.CharField(max_length=6, choices=[(g, g) for g in GRANULARITIES])
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Цель ON CONFLICT при инкрементальном обновлении
+            models.UniqueConstraint(fields=['question', 'granularity', 'bucket'], name='rollup_question_bucket_uniq'),
+        ]
+        indexes = [
+            # Динамика всего опроса: сумма по вопросам в диапазоне интервалов
+            models.Index(fields=['survey', 'granularity', 'bucket'], name='rollup_survey_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.question_id} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}: {self.count}"
+
+
+class IngestCheckpoint(models.Model):
+    """Сколько байт сегмента буфера ответов уже перенесено в UserResponse (сдвигается в одной транзакции с вставкой)"""
+    segment = models.CharField(max_length=100, unique=True)
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Response to {self.question.text}"
\ No newline at end of file
+        return f"{self.segment}: {self.offset}"
@@ -0,0 +1,32 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ResponseCursorPagination(CursorPagination):
+    """Курсорная пагинация ответов по первичному ключу: без OFFSET, страница стоит одинаково на любом объёме"""
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class SearchPagination(PageNumberPagination):
+    """Постраничная выдача результатов поиска по убыванию релевантности (?page=, ?page_size=)"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class UserCursorPagination(CursorPagination):
+    """Пользователи по имени (уникальный индекс): общая пагинация страницы manage_users и /api/users/"""
+    ordering = 'username'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class SurveyCursorPagination(CursorPagination):
+    """Курсорная пагинация главной страницы; порядок (поле сортировки, id) задаётся представлением"""
+    ordering = ('start_date', 'id')
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,115 @@
+"""Динамика ответов: материализованные счётчики по вопросам за минуту, час и сутки (UTC)"""
+from collections import Counter, defaultdict
+from datetime import timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Trunc
+
+from .models import Question, UserResponse, ResponseRollup
+
+GRANULARITIES = ResponseRollup.GRANULARITIES
+# Сколько последних интервалов отдаёт timeline() без явного диапазона
+MAX_BUCKETS = 1000
+UPSERT_CHUNK_SIZE = 1000
+
+
+def bucket_start(moment, granularity):
+    """Начало интервала, в который попадает момент времени"""
+    moment = moment.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+    if granularity in ('hour', 'day'):
+        moment = moment.replace(minute=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def apply(responses, sign):
+    """Сдвигает счётчики интервалов на ответы (sign=1 — созданные, -1 — удалённые); вызывается из tallies"""
+    counts = Counter()
+    for response in responses:
+        for granularity in GRANULARITIES:
+            counts[response.question_id, granularity, bucket_start(response.submitted_at, granularity)] += 1
+    if not counts:
+        return
+    if sign > 0:
+        _upsert(counts)
+    else:
+        _decrement(counts)
+
+
+def _upsert(counts):
+    """Прибавляет счётчики одним INSERT … ON CONFLICT на порцию: новые интервалы создаются без гонок"""
+    qn = connection.ops.quote_name
+    table = qn(ResponseRollup._meta.db_table)
+    columns = ', '.join(qn(column) for column in ('survey_id', 'question_id', 'granularity', 'bucket', 'count'))
+    # Опрос вопроса — подзапросом по первичному ключу: отдельного запроса за survey_id не нужно
+    row = f"((SELECT {qn('survey_id')} FROM {qn(Question._meta.db_table)} WHERE {qn('id')} = %s), %s, %s, %s, %s)"
+    rows = [
+        (question_id, question_id, granularity, connection.ops.adapt_datetimefield_value(bucket), n)
+        for (question_id, granularity, bucket), n in counts.items()
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([row] * len(chunk))} "
+                f"ON CONFLICT ({qn('question_id')}, {qn('granularity')}, {qn('bucket')}) "
+                f"DO UPDATE SET {qn('count')} = {table}.{qn('count')} + excluded.{qn('count')}",
+                [value for values in chunk for value in values],
+            )
+
+
+def _decrement(counts):
+    """Вычитает удалённые ответы одним UPDATE на интервал и значение дельты"""
+    by_bucket = defaultdict(list)
+    for (question_id, granularity, bucket), n in counts.items():
+        by_bucket[granularity, bucket, n].append(question_id)
+    for (granularity, bucket, n), question_ids in by_bucket.items():
+        ResponseRollup.objects.filter(question_id__in=question_ids, granularity=granularity, bucket=bucket) \
+            .update(count=F('count') - n)
+
+
+def discount_option(option):
+    """Вычитает ответы удаляемого варианта (они удалятся каскадом) — один UPDATE на гранулярность"""
+    for granularity in GRANULARITIES:
+        in_bucket = (
+            UserResponse.objects.filter(selected_option=option)
+            .annotate(bucket=Trunc('submitted_at', granularity, tzinfo=dt_timezone.utc))
+            .filter(bucket=OuterRef('bucket'))
+            .values('selected_option').annotate(n=Count('id')).values('n')
+        )
+        ResponseRollup.objects.filter(question_id=option.question_id, granularity=granularity) \
+            .update(count=F('count') - Coalesce(Subquery(in_bucket), 0))
+
+
+def rebuild(survey_ids=None):
+    """Пересчитывает счётчики интервалов с нуля по таблице ответов (внутри транзакции tallies.rebuild)"""
+    rollups = ResponseRollup.objects.all()
+    responses = UserResponse.objects.all()
+    if survey_ids is not None:
+        rollups = rollups.filter(survey_id__in=survey_ids)
+        responses = responses.filter(question__survey_id__in=survey_ids)
+    rollups.delete()
+    for granularity in GRANULARITIES:
+        grouped = (
+            responses.annotate(bucket=Trunc('submitted_at', granularity, tzinfo=dt_timezone.utc))
+            .values_list('question__survey_id', 'question_id', 'bucket').annotate(n=Count('id')).order_by()
+        )
+        ResponseRollup.objects.bulk_create([
+            ResponseRollup(survey_id=survey_id, question_id=question_id, granularity=granularity, bucket=bucket, count=n)
+            for survey_id, question_id, bucket, n in grouped
+        ], batch_size=1000)
+
+
+def timeline(survey_id, granularity, question_id=None, since=None, until=None, limit=MAX_BUCKETS):
+    """[{'bucket', 'responses'}] по возрастанию времени — последние limit непустых интервалов диапазона"""
+    rows = ResponseRollup.objects.filter(survey_id=survey_id, granularity=granularity, count__gt=0)
+    if question_id is not None:
+        rows = rows.filter(question_id=question_id)
+    if since is not None:
+        rows = rows.filter(bucket__gte=bucket_start(since, granularity))
+    if until is not None:
+        rows = rows.filter(bucket__lt=until)
+    buckets = rows.values('bucket').annotate(responses=Sum('count')).order_by('-bucket')[:limit]
+    return list(buckets)[::-1]
@@ -0,0 +1,81 @@
+"""Полнотекстовый поиск по текстовым ответам: FTS5 в SQLite, GIN-индекс по tsvector в PostgreSQL"""
+import re
+
+from django.db import connection
+
+WORD_RE = re.compile(r'\w+')
+SEARCH_CONFIG = 'russian'  # совпадает с выражением индекса в миграции 0006
+
+
+def query_words(query):
+    """Слова запроса без операторов и кавычек: пользовательский ввод не ломает синтаксис MATCH/tsquery"""
+    return WORD_RE.findall(query.lower())
+
+
+def _sqlite_match(words):
+    # Каждое слово — префикс: «достав» находит «доставка» и «доставку»
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _postgres_match(words):
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+class TextAnswerSearch:
+    """Ранжированные совпадения для Paginator: число и срезы считаются в SQL через индекс, без чтения всей таблицы"""
+
+    def __init__(self, survey_id, query, question_id=None):
+        self.words = query_words(query)
+        self.filters = ['q.survey_id = %s']
+        self.params = [survey_id]
+        if question_id is not None:
+            self.filters.append('r.question_id = %s')
+            self.params.append(question_id)
+        self._count = None
+
+    def _sql(self, columns, tail=''):
+        where = ' AND '.join(self.filters)
+        if connection.vendor == 'postgresql':
+            return (f"SELECT {columns} FROM survey_userresponse r JOIN survey_question q ON q.id = r.question_id, "
+                    f"to_tsquery('{SEARCH_CONFIG}', %s) query "
+                    f"WHERE to_tsvector('{SEARCH_CONFIG}', COALESCE(r.text_response, '')) @@ query AND {where} {tail}",
+                    [_postgres_match(self.words), *self.params])
+        return (f"SELECT {columns} FROM survey_response_fts JOIN survey_userresponse r ON r.id = survey_response_fts.rowid "
+                f"JOIN survey_question q ON q.id = r.question_id "
+                f"WHERE survey_response_fts MATCH %s AND {where} {tail}",
+                [_sqlite_match(self.words), *self.params])
+
+    def _rank_columns(self):
+        if connection.vendor == 'postgresql':
+            return (f"ts_rank(to_tsvector('{SEARCH_CONFIG}', COALESCE(r.text_response, '')), query), "
+                    f"ts_headline('{SEARCH_CONFIG}', r.text_response, query, "
+                    f"'StartSel=[, StopSel=], MaxFragments=1, MaxWords=20')")
+        # bm25 тем меньше, чем лучше совпадение: меняем знак, чтобы «больше — лучше» на обеих БД
+        return "-bm25(survey_response_fts), snippet(survey_response_fts, 0, '[', ']', '…', 12)"
+
+    def count(self):
+        if not self.words:
+            return 0
+        if self._count is None:
+            sql, params = self._sql('COUNT(*)')
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not self.words or page.stop <= page.start:
+            return []
+        columns = f'r.id, r.question_id, r.user_id, r.text_response, {self._rank_columns()}'
+        sql, params = self._sql(columns, 'ORDER BY 5 DESC, r.id LIMIT %s OFFSET %s')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, page.stop - page.start, page.start])
+            rows = cursor.fetchall()
+        return [
+            {'id': pk, 'question': question_id, 'user': user_id, 'text_response': text,
+             'rank': round(rank, 6), 'snippet': snippet}
+            for pk, question_id, user_id, text, rank, snippet in rows
+        ]
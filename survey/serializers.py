@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import *
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для пользователей: CRUD через API"""
@@ -32,6 +33,14 @@ class UserSerializer(serializers.ModelSerializer):
 
 class SurveySerializer(serializers.ModelSerializer):
     """Сериализатор для опросов: CRUD через API"""
+    is_open = serializers.SerializerMethodField()
+
+    def get_is_open(self, obj):
+        """Фактическая активность опроса: берётся из аннотации with_status, если она есть"""
+        if hasattr(obj, 'is_open'):
+            return obj.is_open
+        return obj.is_active and obj.end_date >= timezone.now().date()
+
     def validate(self, data):
         """Проверка, что end_date позже start_date, если оба указаны"""
         start_date = data.get('start_date', self.instance.start_date if self.instance else None)
@@ -42,7 +51,7 @@ class SurveySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Survey
-        fields = ['id', 'title', 'description', 'start_date', 'end_date', 'is_active']
+        fields = ['id', 'title', 'description', 'start_date', 'end_date', 'is_active', 'is_open']
 
 class QuestionSerializer(serializers.ModelSerializer):
     """Сериализатор для вопросов"""
@@ -56,6 +65,27 @@ class AnswerOptionSerializer(serializers.ModelSerializer):
         model = AnswerOption
         fields = ['id', 'question', 'text']
 
+class OptionDefinitionSerializer(serializers.ModelSerializer):
+    """Вариант ответа внутри описания опроса"""
+    class Meta:
+        model = AnswerOption
+        fields = ['id', 'text']
+
+class QuestionDefinitionSerializer(serializers.ModelSerializer):
+    """Вопрос с вариантами ответа внутри описания опроса"""
+    options = OptionDefinitionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Question
+        fields = ['id', 'text', 'question_type', 'options']
+
+class SurveyDefinitionSerializer(SurveySerializer):
+    """Полное описание опроса одним документом: опрос, вопросы и варианты ответа"""
+    questions = QuestionDefinitionSerializer(many=True, read_only=True)
+
+    class Meta(SurveySerializer.Meta):
+        fields = SurveySerializer.Meta.fields + ['updated_at', 'questions']
+
 class UserResponseSerializer(serializers.ModelSerializer):
     """Сериализатор для ответов пользователей"""
     class Meta:
@@ -75,4 +105,8 @@ class ChangePasswordSerializer(serializers.Serializer):
 class ResetPasswordSerializer(serializers.Serializer):
     """Сериализатор для сброса пароля через API"""
     user_id = serializers.IntegerField(required=True)
-    new_password = serializers.CharField(required=True, write_only=True)
\ No newline at end of file
+    new_password = serializers.CharField(required=True, write_only=True)
+
+class ResponseBatchSerializer(serializers.Serializer):
+    """Сериализатор для пакетной загрузки ответов: элементы проверяются отдельно, по карте опроса"""
+    responses = serializers.ListField(child=serializers.JSONField(), allow_empty=False, max_length=10000)
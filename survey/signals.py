@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import Survey, Question, AnswerOption, QuestionTally, OptionTally, UserResponse
+from . import authentication, rollups, tallies
+
+
+@receiver(post_save, sender=Question)
+def create_question_tally(sender, instance, created, **kwargs):
+    """Новый вопрос сразу получает нулевой счётчик"""
+    if created:
+        tallies.create_question_tally(instance)
+
+
+@receiver(post_save, sender=AnswerOption)
+def create_option_tally(sender, instance, created, **kwargs):
+    """Новый вариант ответа сразу получает нулевой счётчик"""
+    if created:
+        tallies.create_option_tally(instance)
+
+
+@receiver(pre_delete, sender=AnswerOption)
+def discount_option_responses(sender, instance, **kwargs):
+    """Ответы удаляемого варианта каскадно исчезнут, вычитаем их из счётчика вопроса"""
+    count = OptionTally.objects.filter(option=instance).values_list('count', flat=True).first()
+    if count:
+        QuestionTally.objects.filter(question_id=instance.question_id).update(responses=F('responses') - count)
+        rollups.discount_option(instance)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def touch_survey_on_question_change(sender, instance, **kwargs):
+    """Изменение вопроса меняет версию опроса (ключи кэша, ETag); при переносе — обоих опросов"""
+    survey_ids = {instance.survey_id}
+    if instance.is_tracked('survey'):
+        survey_ids.add(instance.get_original('survey'))
+    Survey.objects.filter(pk__in=survey_ids).touch()
+
+
+@receiver(post_save, sender=Question)
+def move_responses_with_question(sender, instance, created, **kwargs):
+    """Перенос вопроса в другой опрос переносит и копию survey в его ответах"""
+    if not created and instance.is_tracked('survey') and instance.get_original('survey') != instance.survey_id:
+        UserResponse.objects.filter(question=instance).update(survey_id=instance.survey_id)
+
+
+@receiver(post_save, sender=AnswerOption)
+@receiver(post_delete, sender=AnswerOption)
+def touch_survey_on_option_change(sender, instance, **kwargs):
+    """Изменение варианта ответа меняет версию опроса; при переносе — обоих опросов"""
+    question_ids = {instance.question_id}
+    if instance.is_tracked('question'):
+        question_ids.add(instance.get_original('question'))
+    Survey.objects.filter(questions__id__in=question_ids).touch()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_principal(sender, instance, **kwargs):
+    """Смена пароля, прав или удаление пользователя сразу видны токенам API этого процесса"""
+    authentication.forget_user(instance.pk)
+
+
+def _unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Профиль sqlite: WAL, synchronous=NORMAL, busy_timeout и mmap на каждом новом соединении"""
+    if connection.vendor != 'sqlite':
+        return
+    # Встроенные lower() и LIKE в SQLite не учитывают регистр только для ASCII; unicode_lower — для любых букв
+    connection.connection.create_function('unicode_lower', 1, _unicode_lower, deterministic=True)
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,161 @@
+"""Колоночный снимок ответов для аналитики: целочисленные столбцы в формате .npy и словарь подписей JSON"""
+import ast
+import json
+import mmap
+import struct
+import sys
+import zipfile
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from django.utils import timezone
+
+from .models import Question, AnswerOption, UserResponse
+
+try:
+    import numpy
+except ImportError:  # снимок пишется и читается без NumPy, только без векторных операций
+    numpy = None
+
+LABELS_FILE = 'labels.json'
+# Столбец: (тип элемента array, dtype в заголовке .npy). Коды — номера в словаре подписей, -1 — нет значения
+COLUMNS = {
+    'question': ('i', '<i4'),
+    'option': ('i', '<i4'),
+    'respondent': ('i', '<i4'),
+    'submitted_at': ('q', '<i8'),  # секунды Unix, UTC
+}
+CHUNK_SIZE = 10000
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# Заголовок фиксированной длины (кратной 64, как у NumPy): размер столбца дописывается после выгрузки
+NPY_HEADER_SIZE = 128
+
+
+def _npy_header(descr, length):
+    header = repr({'descr': descr, 'fortran_order': False, 'shape': (length,)}).encode('latin1')
+    header = header.ljust(NPY_HEADER_SIZE - len(NPY_MAGIC) - 2 - 1) + b'\n'
+    return NPY_MAGIC + struct.pack('<H', len(header)) + header
+
+
+class _NpyWriter:
+    """Одномерный массив .npy, дописываемый порциями; память не зависит от длины столбца"""
+
+    def __init__(self, path, typecode, descr):
+        self.file = open(path, 'wb')
+        self.typecode = typecode
+        self.descr = descr
+        self.length = 0
+        self.file.write(_npy_header(descr, 0))
+
+    def write(self, values):
+        chunk = array(self.typecode, values)
+        if sys.byteorder == 'big':
+            chunk.byteswap()  # в файле всегда little-endian, как объявлено в descr
+        chunk.tofile(self.file)
+        self.length += len(chunk)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(_npy_header(self.descr, self.length))
+        self.file.close()
+
+
+def write_snapshot(survey, directory, chunk_size=CHUNK_SIZE):
+    """Пишет снимок ответов опроса в каталог; возвращает словарь подписей (он же labels.json)"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    questions = list(Question.objects.filter(survey=survey).order_by('id').values_list('id', 'text', 'question_type'))
+    options = list(AnswerOption.objects.filter(question__survey=survey).order_by('id')
+                   .values_list('id', 'question_id', 'text'))
+    question_codes = {question_id: code for code, (question_id, _, _) in enumerate(questions)}
+    option_codes = {option_id: code for code, (option_id, _, _) in enumerate(options)}
+    respondent_codes = {}
+    writers = {name: _NpyWriter(directory / f'{name}.npy', typecode, descr)
+               for name, (typecode, descr) in COLUMNS.items()}
+    rows = (UserResponse.objects.filter(question__survey=survey).order_by('id')
+            .values_list('question_id', 'selected_option_id', 'user_id', 'submitted_at').iterator(chunk_size=chunk_size))
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                _write_batch(writers, batch, question_codes, option_codes, respondent_codes)
+                batch = []
+        _write_batch(writers, batch, question_codes, option_codes, respondent_codes)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    labels = {
+        'survey': {'id': survey.id, 'title': survey.title},
+        'created_at': timezone.now().isoformat(),
+        'rows': writers['question'].length,
+        'columns': {name: descr for name, (_, descr) in COLUMNS.items()},
+        'questions': [{'id': pk, 'text': text, 'type': question_type} for pk, text, question_type in questions],
+        'options': [{'id': pk, 'question': question_codes[question_id], 'text': text}
+                    for pk, question_id, text in options],
+        'respondents': list(respondent_codes),
+    }
+    (directory / LABELS_FILE).write_text(json.dumps(labels, ensure_ascii=False), encoding='utf-8')
+    return labels
+
+
+def _write_batch(writers, batch, question_codes, option_codes, respondent_codes):
+    if not batch:
+        return
+    writers['question'].write(question_codes[question_id] for question_id, _, _, _ in batch)
+    writers['option'].write(option_codes.get(option_id, -1) for _, option_id, _, _ in batch)
+    writers['respondent'].write(
+        -1 if user_id is None else respondent_codes.setdefault(user_id, len(respondent_codes))
+        for _, _, user_id, _ in batch
+    )
+    writers['submitted_at'].write(int(submitted_at.timestamp()) for _, _, _, submitted_at in batch)
+
+
+def write_archive(directory, output):
+    """Упаковывает снимок без сжатия в .npz: numpy.load читает его как есть"""
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for name in [*(f'{column}.npy' for column in COLUMNS), LABELS_FILE]:
+            archive.write(Path(directory) / name, name)
+
+
+def _map_column(path):
+    """Столбец .npy через mmap без NumPy: memoryview над страницами файла, без копирования"""
+    with open(path, 'rb') as column:
+        prefix = column.read(len(NPY_MAGIC) + 2)
+        header = ast.literal_eval(column.read(struct.unpack('<H', prefix[-2:])[0]).decode('latin1'))
+        offset = column.tell()
+        typecode = next(code for code, descr in COLUMNS.values() if descr == header['descr'])
+        if sys.byteorder == 'big' or not header['shape'][0]:
+            column.seek(offset)
+            values = array(typecode)
+            values.fromfile(column, header['shape'][0])
+            if sys.byteorder == 'big':
+                values.byteswap()
+            return memoryview(values)
+        mapped = mmap.mmap(column.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped)[offset:].cast(typecode)
+
+
+def load_snapshot(directory):
+    """(столбцы, подписи): с NumPy — numpy.memmap, без него — memoryview над mmap"""
+    directory = Path(directory)
+    labels = json.loads((directory / LABELS_FILE).read_text(encoding='utf-8'))
+    if numpy is not None:
+        columns = {name: numpy.load(directory / f'{name}.npy', mmap_mode='r') for name in COLUMNS}
+    else:
+        columns = {name: _map_column(directory / f'{name}.npy') for name in COLUMNS}
+    return columns, labels
+
+
+def option_tallies(directory):
+    """{id варианта: число выборов} по снимку — numpy.bincount, без NumPy — подсчёт по memoryview"""
+    columns, labels = load_snapshot(directory)
+    option_count = len(labels['options'])
+    if numpy is not None:
+        codes = columns['option']
+        counts = numpy.bincount(codes[codes >= 0], minlength=option_count).tolist()
+    else:
+        counter = Counter(columns['option'])
+        counts = [counter[code] for code in range(option_count)]
+    return {option['id']: count for option, count in zip(labels['options'], counts)}
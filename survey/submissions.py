@@ -0,0 +1,196 @@
+"""Разбор и сохранение ответов на опрос: HTML-форма, отправки (Submission) и пакетная загрузка через API"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import Question, AnswerOption, UserResponse, Submission
+from . import tallies
+
+BATCH_CHUNK_SIZE = 1000
+ALREADY_SUBMITTED = "Вы уже прошли этот опрос."
+ALREADY_ANSWERED = "Вы уже ответили на этот вопрос."
+
+
+def build_responses(questions, data, user_id):
+    """Собирает несохранённые ответы из данных формы, проверяя варианты одним запросом"""
+    responses = []
+    selected = []
+    for question in questions:
+        if question.question_type == 'text':
+            text = data.get(f'text_{question.id}')
+            if text:
+                responses.append(UserResponse(question=question, user_id=user_id, text_response=text))
+            continue
+        option_ids = set()
+        for raw_id in data.getlist(f'option_{question.id}'):
+            try:
+                option_ids.add(int(raw_id))
+            except (TypeError, ValueError):
+                raise ValidationError("Некорректный вариант ответа.")
+        if question.question_type == 'single' and len(option_ids) > 1:
+            raise ValidationError(f"На вопрос '{question.text}' можно выбрать только один вариант.")
+        selected.extend((question, option_id) for option_id in sorted(option_ids))
+
+    if selected:
+        question_ids = [question.id for question in questions]
+        owners = dict(AnswerOption.objects.filter(
+            id__in=[option_id for _, option_id in selected], question_id__in=question_ids
+        ).values_list('id', 'question_id'))
+        for question, option_id in selected:
+            if owners.get(option_id) != question.id:
+                raise ValidationError("Некорректный вариант ответа.")
+            responses.append(UserResponse(question=question, user_id=user_id, selected_option_id=option_id))
+    return responses
+
+
+def save_responses(responses):
+    """Сохраняет ответы одной вставкой и обновляет счётчики в той же транзакции"""
+    with transaction.atomic():
+        created = UserResponse.objects.bulk_create(responses)
+        tallies.record_responses(created)
+    return created
+
+
+def has_submitted(survey_id, user_id):
+    """Отправлял ли пользователь этот опрос — проверка по уникальному индексу (survey, user)"""
+    return Submission.objects.filter(survey_id=survey_id, user_id=user_id).exists()
+
+
+def already_answered(submission, question, selected_option):
+    """Есть ли в отправке ответ на вопрос; для вопроса с несколькими вариантами — именно этот вариант"""
+    answers = submission.responses.filter(question=question)
+    if question.question_type == 'multiple':
+        answers = answers.filter(selected_option=selected_option)
+    return answers.exists()
+
+
+def save_submission(survey, user_id, responses):
+    """Сохраняет отправку формы: заголовок, ответы и счётчики в одной транзакции; повтор — ValidationError"""
+    try:
+        with transaction.atomic():
+            # Заголовок вставляется первым: повторную отправку отсекает уникальный индекс без лишнего SELECT
+            submission = Submission.objects.create(survey=survey, user_id=user_id)
+            for response in responses:
+                response.submission = submission
+                response.submitted_at = submission.created_at
+            created = UserResponse.objects.bulk_create(responses)
+            tallies.record_responses(created)
+    except IntegrityError:
+        if has_submitted(survey.id, user_id):
+            raise ValidationError(ALREADY_SUBMITTED)
+        raise
+    return created
+
+
+def attach_submissions(survey_id, responses):
+    """Привязывает несохранённые ответы к отправкам их пользователей, заводя недостающие (API, пакетная загрузка)"""
+    user_ids = {response.user_id for response in responses if response.user_id is not None}
+    if not user_ids:
+        return
+    submission_ids = dict(Submission.objects.filter(survey_id=survey_id, user_id__in=user_ids)
+                          .values_list('user_id', 'id'))
+    missing = user_ids - submission_ids.keys()
+    if missing:
+        # ignore_conflicts: параллельный запрос мог создать ту же отправку, её id читается ниже
+        Submission.objects.bulk_create([Submission(survey_id=survey_id, user_id=user_id) for user_id in missing],
+                                       ignore_conflicts=True)
+        submission_ids.update(Submission.objects.filter(survey_id=survey_id, user_id__in=missing)
+                              .values_list('user_id', 'id'))
+    for response in responses:
+        if response.user_id is not None:
+            response.submission_id = submission_ids[response.user_id]
+
+
+def answer_map(survey):
+    """Карта {question_id: (тип, frozenset(option_id))} опроса; в кэше до следующего изменения опроса"""
+    key = f'survey:{survey.id}:answer-map:{survey.updated_at.timestamp()}'
+    mapping = cache.get(key)
+    if mapping is None:
+        options = {}
+        for option_id, question_id in AnswerOption.objects.filter(question__survey=survey).values_list('id', 'question_id'):
+            options.setdefault(question_id, set()).add(option_id)
+        mapping = {
+            question_id: (question_type, frozenset(options.get(question_id, ())))
+            for question_id, question_type in Question.objects.filter(survey=survey).values_list('id', 'question_type')
+        }
+        cache.set(key, mapping, 3600)
+    return mapping
+
+
+def _validate_item(item, mapping, default_user_id, allow_other_users, known_users):
+    """Проверяет один элемент пакета; возвращает несохранённый ответ или текст ошибки"""
+    if not isinstance(item, dict):
+        return "Элемент должен быть объектом."
+    question_id = item.get('question')
+    if not isinstance(question_id, int) or question_id not in mapping:
+        return "Вопрос не относится к этому опросу."
+    user_id = item.get('user', default_user_id)
+    if user_id != default_user_id:
+        if not allow_other_users:
+            return "Только администратор может отправлять ответы за других пользователей."
+        if not isinstance(user_id, int) or user_id not in known_users:
+            return "Пользователь не найден."
+    question_type, option_ids = mapping[question_id]
+    option_id = item.get('selected_option')
+    text = item.get('text_response')
+    if question_type == 'text':
+        if option_id is not None or not isinstance(text, str) or not text:
+            return "Для текстового вопроса нужен непустой text_response без selected_option."
+        return UserResponse(question_id=question_id, user_id=user_id, text_response=text)
+    if text or not isinstance(option_id, int) or option_id not in option_ids:
+        return "Вариант ответа не относится к этому вопросу."
+    return UserResponse(question_id=question_id, user_id=user_id, selected_option_id=option_id)
+
+
+def _answer_key(mapping, user_id, question_id, option_id):
+    # Ответ на вопрос в отправке один; у вопроса с несколькими вариантами — один на каждый вариант
+    return user_id, question_id, option_id if mapping[question_id][0] == 'multiple' else None
+
+
+def _answered(survey_id, responses, mapping):
+    """Ключи ответов, уже сохранённых в отправках пользователей пакета, — одним запросом"""
+    if not responses:
+        return set()
+    rows = UserResponse.objects.filter(
+        submission__survey_id=survey_id, submission__user_id__in={response.user_id for response in responses},
+        question_id__in={response.question_id for response in responses},
+    ).values_list('submission__user_id', 'question_id', 'selected_option_id')
+    return {_answer_key(mapping, *row) for row in rows}
+
+
+def ingest_batch(survey, items, user, chunk_size=None):
+    """Проверяет пакет ответов по карте опроса и вставляет корректные порциями bulk_create"""
+    chunk_size = chunk_size or BATCH_CHUNK_SIZE
+    mapping = answer_map(survey)
+    known_users = set()
+    if user.is_staff:
+        requested = {item.get('user') for item in items if isinstance(item, dict)} - {user.id, None}
+        known_users = set(User.objects.filter(id__in=[u for u in requested if isinstance(u, int)])
+                          .values_list('id', flat=True))
+    checked_items = [_validate_item(item, mapping, user.id, user.is_staff, known_users) for item in items]
+    # Повтор уже отправленного ответа (или повтор внутри пакета) отклоняется по тому же правилу, что и в API
+    taken = _answered(survey.id, [checked for checked in checked_items if not isinstance(checked, str)], mapping)
+    results = []
+    valid = []
+    for index, checked in enumerate(checked_items):
+        if not isinstance(checked, str):
+            key = _answer_key(mapping, checked.user_id, checked.question_id, checked.selected_option_id)
+            if key in taken:
+                checked = ALREADY_ANSWERED
+            taken.add(key)
+        if isinstance(checked, str):
+            results.append({'index': index, 'status': 'error', 'error': checked})
+        else:
+            checked.survey_id = survey.id
+            result = {'index': index, 'status': 'created'}
+            results.append(result)
+            valid.append((result, checked))
+    # Пакет дополняет отправку пользователя (загрузка частями с планшетов), а не считается новой
+    attach_submissions(survey.id, [response for _, response in valid])
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        created = save_responses([response for _, response in chunk])
+        for (result, _), response in zip(chunk, created):
+            result['id'] = response.id
+    return results
@@ -0,0 +1,115 @@
+"""Материализованные счётчики ответов: инкрементальное обновление и перестроение"""
+from collections import Counter, defaultdict
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Question, AnswerOption, UserResponse, QuestionTally, OptionTally
+from . import rollups
+
+
+def record_responses(responses):
+    """Учитывает созданные ответы в счётчиках"""
+    _apply(responses, 1)
+
+
+def discard_responses(responses):
+    """Убирает удалённые ответы из счётчиков"""
+    _apply(responses, -1)
+
+
+def _apply(responses, sign):
+    question_counts = Counter()
+    option_counts = Counter()
+    for response in responses:
+        question_counts[response.question_id] += 1
+        if response.selected_option_id:
+            option_counts[response.selected_option_id] += 1
+    if not question_counts:
+        return
+    with transaction.atomic():
+        missing_questions = _bump(QuestionTally, 'question_id', 'responses', question_counts, sign)
+        missing_options = _bump(OptionTally, 'option_id', 'count', option_counts, sign)
+        if sign > 0:
+            _create_missing(missing_questions, question_counts, missing_options, option_counts)
+        rollups.apply(responses, sign)
+
+
+def _bump(model, key, field, counts, sign):
+    """Сдвигает счётчики одним UPDATE на каждое различное значение дельты"""
+    by_delta = defaultdict(list)
+    for pk, delta in counts.items():
+        by_delta[delta].append(pk)
+    missing = []
+    for delta, pks in by_delta.items():
+        rows = model.objects.filter(**{f'{key}__in': pks})
+        updated = rows.update(**{field: F(field) + sign * delta})
+        if updated != len(pks):
+            present = set(rows.values_list(key, flat=True))
+            missing.extend(pk for pk in pks if pk not in present)
+    return missing
+
+
+def _create_missing(question_ids, question_counts, option_ids, option_counts):
+    """Создаёт строки счётчиков, которых ещё нет (например, до перестроения)"""
+    if question_ids:
+        QuestionTally.objects.bulk_create([
+            QuestionTally(survey_id=survey_id, question_id=pk, responses=question_counts[pk])
+            for pk, survey_id in Question.objects.filter(id__in=question_ids).values_list('id', 'survey_id')
+        ], ignore_conflicts=True)
+    if option_ids:
+        OptionTally.objects.bulk_create([
+            OptionTally(survey_id=survey_id, question_id=question_id, option_id=pk, count=option_counts[pk])
+            for pk, question_id, survey_id in AnswerOption.objects.filter(id__in=option_ids)
+            .values_list('id', 'question_id', 'question__survey_id')
+        ], ignore_conflicts=True)
+
+
+def create_question_tally(question):
+    """Заводит нулевой счётчик для нового вопроса"""
+    QuestionTally.objects.get_or_create(question=question, defaults={'survey_id': question.survey_id})
+
+
+def create_option_tally(option):
+    """Заводит нулевой счётчик для нового варианта ответа"""
+    OptionTally.objects.get_or_create(option=option, defaults={
+        'question_id': option.question_id,
+        'survey_id': Question.objects.values_list('survey_id', flat=True).get(id=option.question_id),
+    })
+
+
+def rebuild(survey_ids=None):
+    """Пересчитывает счётчики (и счётчики по интервалам времени) с нуля по таблице ответов"""
+    questions = Question.objects.all()
+    options = AnswerOption.objects.all()
+    if survey_ids is not None:
+        questions = questions.filter(survey_id__in=survey_ids)
+        options = options.filter(question__survey_id__in=survey_ids)
+    responses = UserResponse.objects.filter(question__in=questions)
+    with transaction.atomic():
+        QuestionTally.objects.filter(question__in=questions).delete()
+        OptionTally.objects.filter(option__in=options).delete()
+        question_counts = dict(responses.values_list('question_id').annotate(n=Count('id')).order_by())
+        option_counts = dict(
+            responses.filter(selected_option__isnull=False)
+            .values_list('selected_option_id').annotate(n=Count('id')).order_by()
+        )
+        question_tallies = QuestionTally.objects.bulk_create([
+            QuestionTally(survey_id=survey_id, question_id=pk, responses=question_counts.get(pk, 0))
+            for pk, survey_id in questions.values_list('id', 'survey_id')
+        ], batch_size=1000)
+        option_tallies = OptionTally.objects.bulk_create([
+            OptionTally(survey_id=survey_id, question_id=question_id, option_id=pk, count=option_counts.get(pk, 0))
+            for pk, question_id, survey_id in options.values_list('id', 'question_id', 'question__survey_id')
+        ], batch_size=1000)
+        rollups.rebuild(survey_ids)
+    return len(question_tallies), len(option_tallies)
+
+
+def tally_value(obj, field):
+    """Значение счётчика объекта, загруженного через select_related('tally')"""
+    try:
+        return getattr(obj.tally, field)
+    except ObjectDoesNotExist:
+        return 0
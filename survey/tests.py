@@ -1,10 +1,26 @@
-from django.test import TestCase
+from django.test import Client, TestCase, override_settings
 from rest_framework.test import APIClient
 from django.urls import reverse
 from django.contrib.auth.models import User
-from .models import Survey, Question, AnswerOption, UserResponse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .models import (Survey, Question, AnswerOption, UserResponse, QuestionTally, OptionTally, IngestCheckpoint,
+                     ResponseRollup, Submission)
+from . import authentication, bench, crosstab, exports, ingest, rollups, snapshots, submissions, tallies, users
+from .pagination import ResponseCursorPagination, SurveyCursorPagination, UserCursorPagination
 from django.utils import timezone
-from datetime import date
+from datetime import date, datetime, timezone as dt_timezone
+from io import BytesIO, StringIO
+import asyncio
+import tempfile
+import unittest
+import zipfile
+import csv
+import json
+from unittest import mock
+from contextlib import contextmanager
 
 
 class SurveyTests(TestCase):
@@ -45,7 +61,7 @@ class SurveyTests(TestCase):
     def test_get_all_users_api(self):
         response = self.admin_client.get('/api/users/')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 2)  # admin и testuser
+        self.assertEqual(len(response.data['results']), 2)  # admin и testuser
 
     def test_get_user_by_id_api(self):
         response = self.admin_client.get(f'/api/users/{self.user.id}/')
@@ -219,4 +235,1494 @@ class SurveyIntegrationTests(TestCase):
         self.assertEqual(option_response.status_code, 201)
         self.assertEqual(user_response.status_code, 201)
         self.assertEqual(stats_response.status_code, 200)
-        self.assertEqual(stats_response.data['total_responses'], 1)
\ No newline at end of file
+        self.assertEqual(stats_response.data['total_responses'], 1)
+
+class SurveyTallyTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.admin_client = APIClient()
+        self.admin_client.login(username='admin', password='admin123')
+        self.user_client = APIClient()
+        self.user_client.login(username='testuser', password='test123')
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Tally Survey', start_date=today,
+                                            end_date=today + timezone.timedelta(days=10))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='multiple')
+        self.yes = AnswerOption.objects.create(question=self.question, text='Yes')
+        self.no = AnswerOption.objects.create(question=self.question, text='No')
+        self.text_question = Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+
+    def test_submit_response_updates_tallies(self):
+        self.user_client.post(reverse('submit_response', kwargs={'survey_id': self.survey.id}), {
+            f'option_{self.question.id}': [self.yes.id, self.no.id],
+            f'text_{self.text_question.id}': 'Отлично',
+        })
+        self.assertEqual(OptionTally.objects.get(option=self.yes).count, 1)
+        self.assertEqual(OptionTally.objects.get(option=self.no).count, 1)
+        self.assertEqual(QuestionTally.objects.get(question=self.question).responses, 2)
+        self.assertEqual(QuestionTally.objects.get(question=self.text_question).responses, 1)
+
+    def test_response_api_create_and_delete_update_tallies(self):
+        response = self.user_client.post(reverse('responses-list'), {
+            'question': self.question.id,
+            'selected_option': self.yes.id
+        }, format='json')
+        self.assertEqual(OptionTally.objects.get(option=self.yes).count, 1)
+        self.user_client.delete(reverse('responses-detail', kwargs={'pk': response.data['id']}))
+        self.assertEqual(OptionTally.objects.get(option=self.yes).count, 0)
+        self.assertEqual(QuestionTally.objects.get(question=self.question).responses, 0)
+
+    def test_statistics_query_count_does_not_grow_with_options(self):
+        for i in range(10):
+            option = AnswerOption.objects.create(question=self.question, text=f'Option {i}')
+            UserResponse.objects.create(question=self.question, selected_option=option, user=self.user)
+        tallies.rebuild()
+        url = reverse('survey-statistics', kwargs={'survey_id': self.survey.id})
+        self.admin_client.get(url)  # прогрев сессии и прав
+        with self.assertNumQueries(7):
+            response = self.admin_client.get(url)
+        self.assertEqual(response.data['total_responses'], 10)
+        self.assertEqual(response.data['by_question']['Q1']['options']['Option 3'], 1)
+
+    def test_rebuild_tallies_command(self):
+        UserResponse.objects.create(question=self.question, selected_option=self.no, user=self.user)
+        call_command('rebuild_tallies', survey=[self.survey.id], stdout=StringIO())
+        self.assertEqual(OptionTally.objects.get(option=self.no).count, 1)
+        self.assertEqual(QuestionTally.objects.get(question=self.question).responses, 1)
+
+
+class SubmitResponseTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.client.login(username='testuser', password='test123')
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Submit Survey', start_date=today,
+                                            end_date=today + timezone.timedelta(days=10))
+        self.single = Question.objects.create(survey=self.survey, text='Single', question_type='single')
+        self.multiple = Question.objects.create(survey=self.survey, text='Multiple', question_type='multiple')
+        self.single_options = [AnswerOption.objects.create(question=self.single, text=f'S{i}') for i in range(3)]
+        self.multiple_options = [AnswerOption.objects.create(question=self.multiple, text=f'M{i}') for i in range(5)]
+        self.url = reverse('submit_response', kwargs={'survey_id': self.survey.id})
+
+    def test_submit_creates_all_responses(self):
+        response = self.client.post(self.url, {
+            f'option_{self.single.id}': self.single_options[0].id,
+            f'option_{self.multiple.id}': [option.id for option in self.multiple_options],
+        })
+        self.assertRedirects(response, reverse('survey_list'))
+        self.assertEqual(UserResponse.objects.filter(user=self.user).count(), 6)
+
+    def test_submit_query_count_does_not_grow_with_selected_options(self):
+        data = {f'option_{self.multiple.id}': [option.id for option in self.multiple_options]}
+        with self.assertNumQueries(14):
+            self.client.post(self.url, data)
+        self.assertEqual(UserResponse.objects.count(), 5)
+
+    def test_option_from_another_question_is_rejected(self):
+        response = self.client.post(self.url, {f'option_{self.single.id}': self.multiple_options[0].id})
+        self.assertRedirects(response, reverse('survey_detail', kwargs={'survey_id': self.survey.id}))
+        self.assertFalse(UserResponse.objects.exists())
+
+    def test_unknown_or_malformed_option_is_rejected(self):
+        for value in ['999999', 'abc']:
+            self.client.post(self.url, {f'option_{self.single.id}': value})
+        self.assertFalse(UserResponse.objects.exists())
+
+    def test_several_options_for_single_choice_are_rejected(self):
+        self.client.post(self.url, {f'option_{self.single.id}': [o.id for o in self.single_options[:2]]})
+        self.assertFalse(UserResponse.objects.exists())
+
+
+class SurveyExpiryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.client.login(username='testuser', password='test123')
+        today = timezone.now().date()
+        self.expired = Survey.objects.create(title='Expired', start_date=today - timezone.timedelta(days=10),
+                                             end_date=today - timezone.timedelta(days=1))
+        self.current = Survey.objects.create(title='Current', start_date=today,
+                                             end_date=today + timezone.timedelta(days=1))
+
+    def test_get_requests_never_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('survey_list'))
+            self.client.get(reverse('survey_detail', kwargs={'survey_id': self.expired.id}))
+            self.client.get(reverse('survey_results', kwargs={'survey_id': self.expired.id}))
+        statements = [query['sql'].split()[0].upper() for query in queries.captured_queries]
+        self.assertNotIn('UPDATE', statements)
+        self.expired.refresh_from_db()
+        self.assertTrue(self.expired.is_active)
+
+    def test_status_is_computed_in_query(self):
+        surveys = {survey.title: survey.is_open for survey in Survey.objects.with_status()}
+        self.assertEqual(surveys, {'Expired': False, 'Current': True})
+        response = self.client.get(reverse('survey_detail', kwargs={'survey_id': self.expired.id}))
+        self.assertContains(response, 'Этот опрос уже закончился')
+
+    def test_api_status_follows_the_clock(self):
+        url = reverse('surveys-detail', kwargs={'pk': self.current.id})
+        self.assertTrue(self.client.get(url).data['is_open'])
+        later = timezone.now() + timezone.timedelta(days=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertFalse(self.client.get(url).data['is_open'])
+            listing = {survey['title']: survey['is_open'] for survey in self.client.get(reverse('surveys-list')).data}
+        self.assertEqual(listing, {'Expired': False, 'Current': False})
+
+    def test_submit_to_expired_survey_is_rejected(self):
+        question = Question.objects.create(survey=self.expired, text='Q', question_type='text')
+        self.client.post(reverse('submit_response', kwargs={'survey_id': self.expired.id}),
+                         {f'text_{question.id}': 'late'})
+        self.assertFalse(UserResponse.objects.exists())
+
+    def test_expire_surveys_command(self):
+        call_command('expire_surveys', stdout=StringIO())
+        self.expired.refresh_from_db()
+        self.current.refresh_from_db()
+        self.assertFalse(self.expired.is_active)
+        self.assertTrue(self.current.is_active)
+
+
+class SurveyDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.client.login(username='admin', password='admin123')
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Cached Survey', start_date=today,
+                                            end_date=today + timezone.timedelta(days=10))
+        self.url = reverse('survey_detail', kwargs={'survey_id': self.survey.id})
+
+    def add_questions(self, count):
+        for i in range(count):
+            question = Question.objects.create(survey=self.survey, text=f'Question {i}', question_type='single')
+            AnswerOption.objects.create(question=question, text=f'Option {i}')
+
+    def test_query_count_does_not_depend_on_question_count(self):
+        self.add_questions(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        cache.clear()
+        self.add_questions(20)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Question 19')
+        self.assertEqual(len(few), len(many))
+
+    def test_cached_form_skips_question_queries(self):
+        self.add_questions(3)
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(self.url)
+        self.assertEqual(len(cold) - len(warm), 2)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_cache_is_invalidated_by_option_change(self):
+        self.add_questions(1)
+        self.client.get(self.url)
+        question = self.survey.questions.get()
+        admin_api = APIClient()
+        admin_api.login(username='admin', password='admin123')
+        admin_api.post(reverse('answers-list'), {'question': question.id, 'text': 'Brand new option'}, format='json')
+        self.assertContains(self.client.get(self.url), 'Brand new option')
+
+    def test_cache_is_invalidated_by_added_question(self):
+        self.client.get(self.url)
+        self.client.post(reverse('add_question', kwargs={'survey_id': self.survey.id}),
+                         {'text': 'Added later', 'question_type': 'text'})
+        self.assertContains(self.client.get(self.url), 'Added later')
+
+
+class ResponsePaginationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.admin_client = APIClient()
+        self.admin_client.login(username='admin', password='admin123')
+        self.survey = Survey.objects.create(title='Big Survey', start_date=date(2025, 3, 1), end_date=date(2025, 3, 10))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='text')
+        UserResponse.objects.bulk_create([
+            UserResponse(question=self.question, text_response=f'answer {i}', user=self.admin) for i in range(250)
+        ])
+
+    def collect_pages(self, url):
+        ids = []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.admin_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                ids.extend(item['id'] for item in response.data['results'])
+                url = response.data['next']
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+        return ids
+
+    def test_survey_answers_are_paginated_by_cursor(self):
+        url = reverse('survey-answers', kwargs={'survey_id': self.survey.id}) + '?page_size=100'
+        ids = self.collect_pages(url)
+        self.assertEqual(len(ids), 250)
+        self.assertEqual(ids, sorted(ids))
+
+    def test_answers_by_question_and_own_responses_are_paginated(self):
+        url = reverse('survey-answers-by-question', kwargs={'survey_id': self.survey.id, 'question_id': self.question.id})
+        self.assertEqual(len(self.collect_pages(url)), 250)
+        self.assertEqual(len(self.collect_pages(reverse('responses-list'))), 250)
+
+    def test_survey_copy_follows_question(self):
+        UserResponse.objects.bulk_create([UserResponse(question_id=self.question.id, text_response='by id')])
+        self.assertFalse(UserResponse.objects.filter(survey__isnull=True).exists())
+        other = Survey.objects.create(title='Other', start_date=date(2025, 3, 1), end_date=date(2025, 3, 10))
+        question = Question.objects.get(id=self.question.id)
+        question.survey = other
+        question.save()
+        self.assertEqual(UserResponse.objects.filter(survey=other).count(), 251)
+
+    def test_page_size_is_bounded(self):
+        url = reverse('survey-answers', kwargs={'survey_id': self.survey.id}) + '?page_size=100000'
+        with mock.patch.object(ResponseCursorPagination, 'max_page_size', 50):
+            response = self.admin_client.get(url)
+        self.assertEqual(len(response.data['results']), 50)
+
+
+class SurveyExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.admin_client = APIClient()
+        self.admin_client.login(username='admin', password='admin123')
+        self.survey = Survey.objects.create(title='Export', start_date=date(2025, 3, 1), end_date=date(2025, 3, 10))
+        question = Question.objects.create(survey=self.survey, text='Любимый цвет?', question_type='single')
+        option = AnswerOption.objects.create(question=question, text='Синий')
+        comment = Question.objects.create(survey=self.survey, text='Комментарий', question_type='text')
+        UserResponse.objects.create(question=question, selected_option=option, user=self.admin)
+        UserResponse.objects.create(question=comment, text_response='Всё, "отлично"', user=self.admin)
+        self.url = reverse('survey-export', kwargs={'survey_id': self.survey.id})
+
+    def test_csv_export_streams_rows(self):
+        response = self.admin_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], exports.EXPORT_FIELDS)
+        self.assertEqual(rows[1][3:6], ['Любимый цвет?', str(AnswerOption.objects.get().id), 'Синий'])
+        self.assertEqual(rows[2][6], 'Всё, "отлично"')
+
+    def test_ndjson_export(self):
+        response = self.admin_client.get(self.url + '?type=ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['question'] for line in lines], ['Любимый цвет?', 'Комментарий'])
+
+    def test_export_requires_admin_and_known_type(self):
+        self.assertEqual(self.admin_client.get(self.url + '?type=xml').status_code, 400)
+        User.objects.create_user(username='testuser', password='test123')
+        user_client = APIClient()
+        user_client.login(username='testuser', password='test123')
+        self.assertEqual(user_client.get(self.url).status_code, 403)
+
+    def test_export_responses_command(self):
+        out = StringIO()
+        call_command('export_responses', self.survey.id, '--type', 'ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN в формате SQLite")
+class UserResponseQueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN для горячих запросов к UserResponse: ни один не должен сканировать таблицу целиком"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.admin_client = APIClient()
+        self.admin_client.login(username='admin', password='admin123')
+        self.survey = Survey.objects.create(title='Plans', start_date=date(2025, 3, 1), end_date=date(2025, 3, 10))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='single')
+        self.text_question = Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+        option = AnswerOption.objects.create(question=self.question, text='Yes')
+        UserResponse.objects.bulk_create(
+            [UserResponse(question=self.question, selected_option=option, user=self.admin) for _ in range(20)]
+            + [UserResponse(question=self.text_question, text_response='text', user=self.admin) for _ in range(20)]
+        )
+
+    def assertNoFullScans(self, queries, presorted=False):
+        checked = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if 'survey_userresponse' not in sql or not sql.startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+                checked += 1
+                for step in plan:
+                    self.assertFalse(step.startswith('SCAN survey_userresponse'), f"{step}\n{sql}")
+                    # Курсорная страница не должна сортировать все подходящие строки
+                    if presorted:
+                        self.assertFalse(step.startswith('USE TEMP B-TREE'), f"{step}\n{sql}")
+        self.assertGreater(checked, 0)
+
+    def test_results_and_statistics(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.admin_client.get(reverse('survey_results', kwargs={'survey_id': self.survey.id}))
+            self.admin_client.get(reverse('survey-statistics', kwargs={'survey_id': self.survey.id}))
+        self.assertNoFullScans(queries)
+
+    def test_answer_listings(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.admin_client.get(reverse('survey-answers', kwargs={'survey_id': self.survey.id}))
+            self.admin_client.get(reverse('survey-answers-by-question',
+                                          kwargs={'survey_id': self.survey.id, 'question_id': self.question.id}))
+            self.admin_client.get(reverse('responses-list'))
+        self.assertNoFullScans(queries, presorted=True)
+
+    def test_tally_rebuild_uses_composite_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            tallies.rebuild([self.survey.id])
+        self.assertNoFullScans(queries)
+        with connection.cursor() as cursor:
+            sql = next(q['sql'] for q in queries if 'GROUP BY' in q['sql'] and 'selected_option_id' in q['sql'])
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            self.assertIn('response_question_option_idx', ' '.join(row[-1] for row in cursor.fetchall()))
+
+
+class AsyncApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.async_client.force_login(self.user)
+        self.survey = Survey.objects.create(title='Async Survey', start_date=date(2025, 3, 1), end_date=date(2025, 3, 10))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='single')
+        self.option = AnswerOption.objects.create(question=self.question, text='Yes')
+        responses = UserResponse.objects.bulk_create(
+            [UserResponse(question=self.question, selected_option=self.option, user=self.user) for _ in range(5)]
+        )
+        tallies.record_responses(responses)
+
+    async def test_read_endpoints_match_sync_api(self):
+        response = await self.async_client.get(reverse('async-survey-list'))
+        self.assertEqual(response.json()[0]['title'], 'Async Survey')
+        response = await self.async_client.get(reverse('async-survey-questions', kwargs={'survey_id': self.survey.id}))
+        self.assertEqual(response.json()[0]['text'], 'Q1')
+        response = await self.async_client.get(reverse('async-survey-statistics', kwargs={'survey_id': self.survey.id}))
+        self.assertEqual(response.json()['by_question']['Q1']['options'], {'Yes': 5})
+
+    async def test_invalid_question_filter_is_rejected(self):
+        response = await self.async_client.get(reverse('async-survey-list'), {'questions': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('questions', response.json())
+        response = await self.async_client.get(reverse('async-survey-list'), {'questions': self.question.id})
+        self.assertEqual([survey['title'] for survey in response.json()], ['Async Survey'])
+
+    async def test_answers_are_paginated_by_keyset(self):
+        url = reverse('async-survey-answers', kwargs={'survey_id': self.survey.id}) + '?page_size=2'
+        ids = []
+        while url:
+            data = (await self.async_client.get(url)).json()
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+        self.assertEqual(len(ids), 5)
+
+    async def test_anonymous_requests_are_rejected(self):
+        await self.async_client.alogout()
+        response = await self.async_client.get(reverse('async-survey-list'))
+        self.assertEqual(response.status_code, 403)
+
+    async def test_concurrent_requests_interleave(self):
+        # Оба запроса должны одновременно дойти до обращения к БД: при последовательной
+        # обработке первый так и не дождётся второго и упадёт по таймауту
+        barrier = asyncio.Barrier(2)
+        original_aget = Survey.objects.aget
+
+        async def rendezvous(*args, **kwargs):
+            await asyncio.wait_for(barrier.wait(), timeout=5)
+            return await original_aget(*args, **kwargs)
+
+        url = reverse('async-survey-statistics', kwargs={'survey_id': self.survey.id})
+        with mock.patch.object(Survey.objects, 'aget', rendezvous):
+            responses = await asyncio.gather(self.async_client.get(url), self.async_client.get(url))
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchTests(TestCase):
+    def test_bench_covers_every_route(self):
+        context = bench.seed(surveys=2, questions=5, options=3, responses=50, users=5)
+        report = bench.run(context, iterations=2)
+        json.dumps(report)
+        self.assertEqual(report['unbenchmarked'], [])
+        self.assertEqual(set(report['endpoints']), bench.url_names())
+        for name, result in report['endpoints'].items():
+            self.assertLess(result['status'], 500, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+        self.assertGreater(report['endpoints']['survey_results']['queries'], 0)
+
+
+class QueryBudgetMixin:
+    """assertMaxQueries: тест падает, если блок выполнил больше запросов, чем позволяет бюджет"""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, label=''):
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        executed = len(queries)
+        if executed > budget:
+            listing = '\n'.join(query['sql'] for query in queries.captured_queries)
+            self.fail(f"{label}: {executed} запросов при бюджете {budget}\n{listing}")
+
+
+# Бюджет SQL-запросов на каждый маршрут survey/urls.py (вместе с запросами сессии и пользователя).
+# Набор данных заведомо больше бюджета, поэтому N+1 в любом представлении выходит за его пределы.
+QUERY_BUDGETS = {
+    'survey_list': 1, 'login': 0, 'register': 0, 'logout': 4, 'profile': 2, 'create_survey': 2,
+    'survey_detail': 3, 'submit_response': 14, 'survey_results': 7, 'add_question': 3, 'edit_survey': 3,
+    'delete_survey': 3, 'manage_users': 3, 'create_user': 2, 'api-root': 2, 'users-list': 3,
+    'users-detail': 3, 'surveys-list': 4, 'surveys-detail': 4, 'questions-list': 3, 'questions-detail': 3,
+    'answers-list': 3, 'answers-detail': 3, 'responses-list': 3, 'responses-detail': 3, 'api_register': 11,
+    'api_login': 9, 'api_token': 1, 'api_logout': 4, 'change-password': 2, 'reset-password': 4,
+    'survey-statistics': 7, 'question-autocomplete': 3,
+    'survey-questions': 4, 'survey-answers': 3, 'survey-answers-by-question': 3, 'survey-export': 4,
+    'survey-snapshot': 6,
+    'survey-responses-batch': 14, 'survey-definition': 4, 'survey-search': 5, 'survey-crosstab': 5,
+    'survey-timeline': 4, 'async-survey-list': 3, 'async-survey-questions': 3, 'async-survey-statistics': 7,
+    'async-survey-answers': 3,
+}
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def test_every_view_stays_within_budget(self):
+        context = bench.seed(surveys=3, questions=15, options=5, responses=300, users=20)
+        self.assertEqual(set(QUERY_BUDGETS), bench.url_names())
+        for route in bench.routes(context):
+            client = Client()
+            if route['role'] != 'anon':
+                client.force_login(context[route['role']])
+            bench._call(client, route, 0)  # прогрев кэшей, как в бенчмарке
+            if route['role'] == 'anon':
+                client.cookies.clear()
+            elif route['relogin']:
+                client.force_login(context[route['role']])
+            with self.assertMaxQueries(QUERY_BUDGETS[route['name']], route['name']):
+                bench._call(client, route, 1)
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    def test_query_count_middleware_sets_headers(self):
+        with self.assertLogs('survey.db', level='INFO') as logs:
+            response = Client().get(reverse('survey_list'))
+        self.assertEqual(response['X-DB-Query-Count'], '1')
+        self.assertIn('X-DB-Time-Ms', response)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['queries'], 1)
+
+    def test_query_count_middleware_is_off_by_default(self):
+        self.assertNotIn('X-DB-Query-Count', Client().get(reverse('survey_list')))
+
+
+class TrackedModelTests(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(title='Tracked', description='Long description',
+                                            start_date=date(2025, 3, 1), end_date=date(2025, 3, 10))
+        self.survey = Survey.objects.get(id=self.survey.id)
+
+    def test_save_writes_only_changed_columns_without_select(self):
+        self.survey.title = 'Renamed'
+        with CaptureQueriesContext(connection) as queries:
+            self.survey.save()
+        self.assertEqual(len(queries), 1)
+        sql = queries.captured_queries[0]['sql']
+        self.assertTrue(sql.startswith('UPDATE'))
+        self.assertIn('"title"', sql)
+        self.assertIn('"updated_at"', sql)
+        self.assertNotIn('"description"', sql)
+
+    def test_unchanged_save_is_skipped(self):
+        with self.assertNumQueries(0):
+            self.survey.save()
+
+    def test_start_date_is_immutable_without_extra_query(self):
+        self.survey.start_date = date(2024, 1, 1)
+        self.survey.end_date = date(2025, 4, 1)
+        with self.assertNumQueries(1):
+            self.survey.save()
+        self.survey.refresh_from_db()
+        self.assertEqual(self.survey.start_date, date(2025, 3, 1))
+        self.assertEqual(self.survey.end_date, date(2025, 4, 1))
+
+    def test_partial_save_and_refresh_keep_other_edits_dirty(self):
+        self.survey.title = 'Renamed'
+        self.survey.description = 'New description'
+        self.survey.save(update_fields=['title'])
+        self.assertEqual(self.survey.get_dirty_fields(), ['description'])
+        self.survey.save()
+        stored = Survey.objects.get(id=self.survey.id)
+        self.assertEqual((stored.title, stored.description), ('Renamed', 'New description'))
+        self.survey.title = 'Local'
+        self.survey.end_date = date(2025, 5, 1)
+        self.survey.refresh_from_db(fields=['title'])
+        self.assertEqual(self.survey.get_dirty_fields(), ['end_date'])
+        self.survey.save()
+        self.assertEqual(Survey.objects.get(id=self.survey.id).end_date, date(2025, 5, 1))
+
+    def test_question_and_option_track_fields(self):
+        question = Question.objects.create(survey=self.survey, text='Q', question_type='single')
+        option = AnswerOption.objects.create(question=question, text='A')
+        question = Question.objects.get(id=question.id)
+        option = AnswerOption.objects.get(id=option.id)
+        self.assertEqual(question.get_dirty_fields(), [])
+        option.text = 'B'
+        self.assertEqual(option.get_dirty_fields(), ['text'])
+        option.save()
+        self.assertEqual(option.get_dirty_fields(), [])
+        self.assertEqual(AnswerOption.objects.get(id=option.id).text, 'B')
+
+
+class ResponseBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.other = User.objects.create_user(username='other', password='other123')
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(self.admin)
+        self.user_client = APIClient()
+        self.user_client.force_authenticate(self.user)
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Batch', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='single')
+        self.option = AnswerOption.objects.create(question=self.question, text='Yes')
+        self.text_question = Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+        foreign_survey = Survey.objects.create(title='Other', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.foreign_question = Question.objects.create(survey=foreign_survey, text='Q3', question_type='single')
+        self.foreign_option = AnswerOption.objects.create(question=self.foreign_question, text='No')
+        self.url = reverse('survey-responses-batch', kwargs={'survey_id': self.survey.id})
+
+    def test_each_item_gets_its_own_result(self):
+        response = self.user_client.post(self.url, {'responses': [
+            {'question': self.question.id, 'selected_option': self.option.id},
+            {'question': self.question.id, 'selected_option': self.foreign_option.id},
+            {'question': self.foreign_question.id, 'selected_option': self.foreign_option.id},
+            {'question': self.text_question.id, 'text_response': 'Хорошо'},
+            {'question': self.text_question.id},
+            {'question': self.question.id, 'selected_option': self.option.id, 'user': self.other.id},
+            'not an object',
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([r['status'] for r in response.data['results']],
+                         ['created', 'error', 'error', 'created', 'error', 'error', 'error'])
+        self.assertEqual(UserResponse.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(OptionTally.objects.get(option=self.option).count, 1)
+
+    def multiple_choice(self, options):
+        question = Question.objects.create(survey=self.survey, text='Q4', question_type='multiple')
+        return question, AnswerOption.objects.bulk_create(
+            [AnswerOption(question=question, text=f'Вариант {i}') for i in range(options)])
+
+    def test_admin_can_load_answers_for_many_users(self):
+        question, options = self.multiple_choice(3)
+        items = [{'question': question.id, 'selected_option': option.id, 'user': user.id}
+                 for user in (self.user, self.other) for option in options]
+        with mock.patch.object(submissions, 'BATCH_CHUNK_SIZE', 2), \
+                mock.patch.object(submissions, 'save_responses', wraps=submissions.save_responses) as save:
+            response = self.admin_client.post(self.url, {'responses': items}, format='json')
+        self.assertEqual([len(call.args[0]) for call in save.call_args_list], [2, 2, 2])
+        self.assertEqual(response.data['created'], 6)
+        self.assertTrue(all(result['id'] for result in response.data['results']))
+        self.assertEqual(UserResponse.objects.filter(user=self.other).count(), 3)
+        self.assertEqual(QuestionTally.objects.get(question=question).responses, 6)
+
+    def test_replayed_batch_does_not_repeat_answers(self):
+        question, options = self.multiple_choice(2)
+        items = [
+            {'question': self.question.id, 'selected_option': self.option.id},
+            {'question': self.text_question.id, 'text_response': 'Хорошо'},
+            {'question': question.id, 'selected_option': options[0].id},
+            {'question': question.id, 'selected_option': options[1].id},
+            {'question': question.id, 'selected_option': options[0].id},  # повтор внутри пакета
+        ]
+        response = self.user_client.post(self.url, {'responses': items}, format='json')
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(response.data['results'][4]['error'], submissions.ALREADY_ANSWERED)
+        response = self.user_client.post(self.url, {'responses': items}, format='json')
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual({result['error'] for result in response.data['results']}, {submissions.ALREADY_ANSWERED})
+        self.assertEqual(UserResponse.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(QuestionTally.objects.get(question=self.question).responses, 1)
+        self.assertEqual(OptionTally.objects.get(option=options[0]).count, 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        question, options = self.multiple_choice(106)
+        items = [{'question': question.id, 'selected_option': option.id} for option in options]
+        self.user_client.post(self.url, {'responses': items[:1]}, format='json')  # прогрев карты опроса
+        counts = []
+        for batch in (items[1:6], items[6:]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.user_client.post(self.url, {'responses': batch}, format='json')
+            counts.append(len(queries))
+            self.assertEqual(response.data['created'], len(batch))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_answer_map_is_invalidated_by_new_option(self):
+        self.user_client.post(self.url, {'responses': [
+            {'question': self.question.id, 'selected_option': self.option.id}]}, format='json')
+        option = AnswerOption.objects.create(question=self.question, text='Maybe')
+        response = self.admin_client.post(self.url, {'responses': [
+            {'question': self.question.id, 'selected_option': option.id}]}, format='json')
+        self.assertEqual(response.data['created'], 1)
+
+
+class SurveyDefinitionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Анкета', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.other = Survey.objects.create(title='Другая', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='single')
+        self.option = AnswerOption.objects.create(question=self.question, text='Да')
+        AnswerOption.objects.create(question=self.question, text='Нет')
+        Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+        self.url = reverse('survey-definition', kwargs={'survey_id': self.survey.id})
+
+    def get_definition(self, survey=None):
+        url = reverse('survey-definition', kwargs={'survey_id': (survey or self.survey).id})
+        return json.loads(self.client.get(url).content)
+
+    def test_returns_nested_document(self):
+        document = self.get_definition()
+        self.assertEqual(document['title'], 'Анкета')
+        self.assertTrue(document['is_open'])
+        self.assertEqual([q['text'] for q in document['questions']], ['Q1', 'Q2'])
+        self.assertEqual([o['text'] for o in document['questions'][0]['options']], ['Да', 'Нет'])
+        self.assertEqual(document['questions'][1]['options'], [])
+
+    def test_query_count_does_not_depend_on_questions(self):
+        for i in range(10):
+            question = Question.objects.create(survey=self.survey, text=f'Extra {i}', question_type='multiple')
+            AnswerOption.objects.create(question=question, text='A')
+        with self.assertNumQueries(4):  # версия для ETag, опрос, вопросы, варианты
+            self.client.get(self.url)
+        with self.assertNumQueries(2):  # из кэша: версия для ETag и опрос
+            response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(json.loads(response.content)['questions']), 12)
+
+    def test_cache_is_invalidated_by_changes(self):
+        self.get_definition()
+        self.option.text = 'Конечно'
+        self.option.save()
+        self.assertEqual(self.get_definition()['questions'][0]['options'][0]['text'], 'Конечно')
+        self.question.text = 'Q1 изменён'
+        self.question.save()
+        self.assertEqual(self.get_definition()['questions'][0]['text'], 'Q1 изменён')
+        self.option.delete()
+        self.assertEqual(len(self.get_definition()['questions'][0]['options']), 1)
+        self.survey.refresh_from_db()
+        self.survey.title = 'Новая анкета'
+        self.survey.save()
+        self.assertEqual(self.get_definition()['title'], 'Новая анкета')
+
+    def test_moving_question_invalidates_both_surveys(self):
+        self.get_definition()
+        self.get_definition(self.other)
+        self.question.survey = self.other
+        self.question.save()
+        self.assertEqual([q['text'] for q in self.get_definition()['questions']], ['Q2'])
+        self.assertEqual([q['text'] for q in self.get_definition(self.other)['questions']], ['Q1'])
+
+    def test_expiry_is_visible(self):
+        self.get_definition()
+        Survey.objects.filter(pk=self.survey.pk).update(end_date=timezone.now().date() - timezone.timedelta(days=1))
+        Survey.objects.expire_overdue()
+        document = self.get_definition()
+        self.assertFalse(document['is_active'])
+        self.assertFalse(document['is_open'])
+
+    def test_missing_survey_returns_404(self):
+        self.assertEqual(self.client.get(reverse('survey-definition', kwargs={'survey_id': 999})).status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Опрос', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='single')
+        self.option = AnswerOption.objects.create(question=self.question, text='Да')
+        self.list_url = reverse('surveys-list')
+        self.detail_url = reverse('surveys-detail', kwargs={'pk': self.survey.id})
+        self.questions_url = reverse('survey-questions', kwargs={'survey_id': self.survey.id})
+
+    def assertNotModified(self, url, etag, queries=1):
+        with self.assertNumQueries(queries):  # только версия, без строк и сериализации
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_list_answers_304_until_any_survey_changes(self):
+        etag = self.client.get(self.list_url)['ETag']
+        self.assertNotModified(self.list_url, etag)
+        self.survey.refresh_from_db()
+        self.survey.title = 'Новый'
+        self.survey.save()
+        etag = self.assertModified(self.list_url, etag)
+        Survey.objects.create(title='Ещё', start_date=timezone.now().date(),
+                              end_date=timezone.now().date() + timezone.timedelta(days=1)).delete()
+        self.assertNotModified(self.list_url, etag)
+        self.survey.delete()
+        self.assertModified(self.list_url, etag)
+
+    def test_detail_and_questions_follow_nested_writes(self):
+        detail_etag = self.client.get(self.detail_url)['ETag']
+        questions_etag = self.client.get(self.questions_url)['ETag']
+        self.assertNotModified(self.detail_url, detail_etag)
+        self.assertNotModified(self.questions_url, questions_etag)
+        self.option.text = 'Нет'
+        self.option.save()
+        detail_etag = self.assertModified(self.detail_url, detail_etag)
+        questions_etag = self.assertModified(self.questions_url, questions_etag)
+        Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+        self.assertModified(self.questions_url, questions_etag)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.questions_url)
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(self.questions_url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        Survey.objects.filter(pk=self.survey.pk).update(updated_at=timezone.now() + timezone.timedelta(seconds=5))
+        self.assertEqual(self.client.get(self.questions_url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+        self.assertNotIn('Last-Modified', self.client.get(self.list_url))
+
+    def test_day_change_refreshes_is_open(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        tomorrow = timezone.now() + timezone.timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            self.assertModified(self.detail_url, etag)
+
+    def test_renderers_get_distinct_etags(self):
+        json_etag = self.client.get(self.list_url, HTTP_ACCEPT='application/json')['ETag']
+        html_etag = self.client.get(self.list_url, HTTP_ACCEPT='text/html')['ETag']
+        self.assertNotEqual(json_etag, html_etag)
+
+    def test_missing_survey_is_still_404(self):
+        self.assertEqual(self.client.get(reverse('surveys-detail', kwargs={'pk': 999})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('surveys-detail', kwargs={'pk': 'abc'})).status_code, 404)
+
+
+class BufferedIngestionTests(TestCase):
+    def setUp(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        settings_override = override_settings(INGESTION_MODE='buffered', INGESTION_SPOOL_DIR=spool.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.client.force_login(self.user)
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Buffered', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='single')
+        self.option = AnswerOption.objects.create(question=self.question, text='Да')
+        self.text_question = Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+        self.url = reverse('submit_response', kwargs={'survey_id': self.survey.id})
+        self.data = {f'option_{self.question.id}': self.option.id, f'text_{self.text_question.id}': 'ок\nвторая строка'}
+
+    def test_submission_waits_in_spool_until_flush(self):
+        response = self.client.post(self.url, self.data)
+        self.assertRedirects(response, reverse('survey_list'))
+        self.assertFalse(UserResponse.objects.exists())
+        self.assertGreater(ingest.stats()['pending_bytes'], 0)
+        with self.assertLogs('survey.ingest', level='INFO') as logs:
+            self.assertEqual(ingest.flush(), 2)
+        self.assertIn('flush_lag_s', json.loads(logs.records[0].getMessage()))
+        self.assertEqual(UserResponse.objects.get(question=self.text_question).text_response, 'ок\nвторая строка')
+        self.assertEqual(QuestionTally.objects.get(question=self.question).responses, 1)
+        self.assertEqual(ingest.stats(), {'pending_bytes': 0, 'flush_lag_s': 0.0})
+
+    def post_as(self, username):
+        self.client.force_login(User.objects.create_user(username=username, password='test123'))
+        return self.client.post(self.url, self.data)
+
+    def test_flush_is_exactly_once(self):
+        for i in range(3):
+            self.post_as(f'respondent{i}')
+        with self.assertLogs('survey.ingest', level='INFO'):
+            ingest.flush(batch_size=2)
+        self.assertEqual(ingest.flush(), 0)  # повторный проход ничего не дублирует
+        self.assertEqual(UserResponse.objects.count(), 6)
+
+    def test_failed_batch_is_retried_without_duplicates(self):
+        self.client.post(self.url, self.data)
+        with mock.patch.object(tallies, 'record_responses', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ingest.flush()
+        self.assertFalse(UserResponse.objects.exists())
+        self.assertEqual(IngestCheckpoint.objects.get().offset, 0)
+        with self.assertLogs('survey.ingest', level='INFO'):
+            self.assertEqual(ingest.flush(), 2)
+
+    def test_partial_and_broken_lines(self):
+        self.client.post(self.url, self.data)
+        segment = ingest.segments()[0]
+        with open(segment, 'ab') as spool:
+            spool.write(b'{"queued_at": 1, "respo')  # запись оборвалась при сбое
+        self.post_as('respondent')
+        with self.assertLogs('survey.ingest', level='INFO') as logs:
+            self.assertEqual(ingest.flush(), 4)
+        self.assertTrue(any('broken record' in record.getMessage() for record in logs.records))
+
+    def test_repeated_submission_is_dropped_on_flush(self):
+        self.client.post(self.url, self.data)
+        self.client.post(self.url, self.data)  # ещё не перенесена — проверка по индексу не видит первую
+        with self.assertLogs('survey.ingest', level='INFO') as logs:
+            self.assertEqual(ingest.flush(), 2)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['duplicates'], 1)
+        submission = Submission.objects.get()
+        self.assertEqual(submission.responses.count(), 2)
+        response = self.client.post(self.url, self.data)  # уже перенесена — отказ сразу
+        self.assertRedirects(response, reverse('survey_detail', kwargs={'survey_id': self.survey.id}))
+        self.assertEqual(ingest.stats()['pending_bytes'], 0)
+
+    def test_responses_to_deleted_options_are_dropped(self):
+        self.client.post(self.url, self.data)
+        self.option.delete()
+        with self.assertLogs('survey.ingest', level='INFO'):
+            self.assertEqual(ingest.flush(), 1)
+
+    def test_responses_of_deleted_users_are_kept_without_author(self):
+        self.client.post(self.url, self.data)
+        self.post_as('respondent')
+        self.user.delete()
+        with self.assertLogs('survey.ingest', level='INFO'):
+            self.assertEqual(ingest.flush(), 4)
+        connection.check_constraints()
+        self.assertEqual(UserResponse.objects.filter(user__isnull=True).count(), 2)
+        self.assertEqual(ingest.stats()['pending_bytes'], 0)
+
+    def test_no_submission_header_for_deleted_user(self):
+        self.client.post(self.url, self.data)
+        self.post_as('respondent')
+        self.user.delete()
+        with self.assertLogs('survey.ingest', level='INFO'):
+            ingest.flush()
+        connection.check_constraints()
+        submission = Submission.objects.get()
+        self.assertEqual(submission.user.username, 'respondent')
+        self.assertEqual(submission.responses.count(), 2)
+        self.assertFalse(UserResponse.objects.filter(user__isnull=True, submission__isnull=False).exists())
+
+    def test_old_flushed_segments_are_removed(self):
+        self.client.post(self.url, self.data)
+        later = timezone.now() + timezone.timedelta(hours=ingest.RETENTION_HOURS + 1)
+        with self.assertLogs('survey.ingest', level='INFO'), mock.patch('django.utils.timezone.now', return_value=later):
+            ingest.flush()
+        self.assertEqual(ingest.segments(), [])
+        self.assertFalse(IngestCheckpoint.objects.exists())
+
+    def test_worker_command(self):
+        self.client.post(self.url, self.data)
+        out = StringIO()
+        with self.assertLogs('survey.ingest', level='INFO'):
+            call_command('ingest_worker', '--once', stdout=out)
+        self.assertIn('Перенесено ответов: 2', out.getvalue())
+        self.assertEqual(UserResponse.objects.count(), 2)
+
+
+class DatabaseProfileTests(TestCase):
+    @unittest.skipUnless(connection.vendor == 'sqlite', "PRAGMA есть только в SQLite")
+    def test_sqlite_pragmas_are_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_bench_runs_each_profile_in_its_own_process(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = f'{directory}/bench.json'
+            call_command('bench', '--profiles', 'sqlite,unknown', '--surveys', '1', '--questions', '2',
+                         '--responses', '5', '--users', '2', '--iterations', '1', '--only', 'survey_list',
+                         '--output', output)
+            with open(output, encoding='utf-8') as f:
+                report = json.load(f)
+        self.assertEqual(report['sqlite']['profile'], 'sqlite')
+        self.assertEqual(report['sqlite']['endpoints']['survey_list']['status'], 200)
+        self.assertIn('Неизвестный DB_PROFILE', report['unknown']['error'])
+
+
+class TextAnswerSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='analyst', password='test123')
+        self.client.force_login(self.user)
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Отзывы', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.question = Question.objects.create(survey=self.survey, text='Что понравилось?', question_type='text')
+        self.other_question = Question.objects.create(survey=self.survey, text='Что улучшить?', question_type='text')
+        other_survey = Survey.objects.create(title='Другой', start_date=today, end_date=today + timezone.timedelta(days=5))
+        foreign = Question.objects.create(survey=other_survey, text='Чужой', question_type='text')
+        UserResponse.objects.bulk_create([
+            UserResponse(question=self.question, user=self.user, text_response='Быстрая доставка, доставка вовремя'),
+            UserResponse(question=self.question, user=self.user, text_response='Хорошая цена, но доставку ждали'),
+            UserResponse(question=self.other_question, user=self.user, text_response='Ускорить доставку'),
+            UserResponse(question=self.question, user=self.user, text_response='Вежливая поддержка'),
+            UserResponse(question=foreign, user=self.user, text_response='доставка'),
+        ])
+        self.url = reverse('survey-search', kwargs={'survey_id': self.survey.id})
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_matches_ranked_within_survey(self):
+        data = self.search(q='достав')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['results'][0]['text_response'], 'Быстрая доставка, доставка вовремя')
+        ranks = [result['rank'] for result in data['results']]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertIn('[доставка]', data['results'][0]['snippet'])
+
+    def test_filters_by_question_and_paginates(self):
+        data = self.search(q='достав', question=self.question.id, page_size=1)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNotNone(data['next'])
+        second = self.client.get(data['next']).json()
+        self.assertEqual(second['results'][0]['text_response'], 'Хорошая цена, но доставку ждали')
+
+    def test_all_words_must_match_and_operators_are_ignored(self):
+        self.assertEqual(self.search(q='доставка вовремя')['count'], 1)
+        self.assertEqual(self.search(q='"цена" OR -поддержка*:')['count'], 0)
+        self.assertEqual(self.client.get(self.url, {'q': '  "" '}).status_code, 400)
+
+    def test_index_follows_updates_and_deletes(self):
+        answer = UserResponse.objects.get(text_response='Вежливая поддержка')
+        answer.text_response = 'Поддержка помогла с доставкой'
+        answer.save()
+        self.assertEqual(self.search(q='доставкой')['count'], 1)
+        self.assertEqual(self.search(q='вежливая')['count'], 0)
+        UserResponse.objects.filter(question=self.other_question).delete()
+        self.assertEqual(self.search(q='ускорить')['count'], 0)
+
+
+class TextAnswerStatisticsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.client.force_login(self.user)
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Отзывы', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.question = Question.objects.create(survey=self.survey, text='Отзыв', question_type='text')
+        self.empty_question = Question.objects.create(survey=self.survey, text='Пусто', question_type='text')
+        # Длины 1..30: среднее 15.5, медиана 15, p90 27
+        submissions.save_responses([UserResponse(question=self.question, user=self.user, text_response='x' * length)
+                                    for length in range(1, 31)])
+        self.url = reverse('survey-statistics', kwargs={'survey_id': self.survey.id})
+
+    def test_statistics_return_bounded_sample_and_sql_length_stats(self):
+        data = self.client.get(self.url, {'sample': 5}).json()['by_question']
+        text = data['Отзыв']
+        self.assertEqual(text['answers'], ['x' * length for length in range(30, 25, -1)])  # новые первыми
+        self.assertEqual(text['responses'], 30)
+        self.assertEqual(text['answers_total'], 30)
+        self.assertEqual(text['length'], {'mean': 15.5, 'p50': 15, 'p90': 27, 'max': 30})
+        self.assertEqual(text['answers_url'], reverse('survey-answers-by-question', kwargs={
+            'survey_id': self.survey.id, 'question_id': self.question.id}))
+        self.assertEqual(data['Пусто'], {'type': 'text', 'responses': 0, 'answers': [], 'answers_total': 0,
+                                         'length': None, 'answers_url': data['Пусто']['answers_url']})
+
+    def test_sample_size_is_capped(self):
+        answers = self.client.get(self.url, {'sample': 10 ** 6}).json()['by_question']['Отзыв']['answers']
+        self.assertEqual(len(answers), 30)
+        submissions.save_responses([UserResponse(question=self.question, user=self.user, text_response='y')
+                                    for _ in range(200)])
+        answers = self.client.get(self.url, {'sample': 10 ** 6}).json()['by_question']['Отзыв']['answers']
+        self.assertEqual(len(answers), 100)
+        self.assertEqual(len(self.client.get(self.url).json()['by_question']['Отзыв']['answers']), 20)
+
+    def test_results_page_shows_sample_with_total(self):
+        response = self.client.get(reverse('survey_results', kwargs={'survey_id': self.survey.id}))
+        self.assertEqual(len(response.context['results']['Отзыв']['answers']), 20)
+        self.assertContains(response, 'Последние 20 из 30 ответов.')
+
+
+class CrosstabTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='analyst', password='test123'))
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Crosstab', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.gender = Question.objects.create(survey=self.survey, text='Пол', question_type='single')
+        self.male, self.female = [AnswerOption.objects.create(question=self.gender, text=t) for t in ('М', 'Ж')]
+        self.likes = Question.objects.create(survey=self.survey, text='Нравится?', question_type='single')
+        self.yes, self.no, self.unsure = [AnswerOption.objects.create(question=self.likes, text=t)
+                                          for t in ('Да', 'Нет', 'Не знаю')]
+        self.text = Question.objects.create(survey=self.survey, text='Почему?', question_type='text')
+        # М: 20 «Да», 10 «Нет»; Ж: 5 «Да», 25 «Нет»
+        pairs = [(self.male, self.yes)] * 20 + [(self.male, self.no)] * 10 + \
+                [(self.female, self.yes)] * 5 + [(self.female, self.no)] * 25
+        users = User.objects.bulk_create([User(username=f'respondent{i}') for i in range(len(pairs))])
+        responses = []
+        for user, (gender, answer) in zip(users, pairs):
+            responses += [UserResponse(question=self.gender, selected_option=gender, user=user),
+                          UserResponse(question=self.likes, selected_option=answer, user=user)]
+        responses.append(UserResponse(question=self.likes, selected_option=self.yes))  # аноним без пары
+        submissions.save_responses(responses)
+        self.url = reverse('survey-crosstab', kwargs={'survey_id': self.survey.id})
+
+    def get(self, row, col):
+        return self.client.get(self.url, {'row': row.id, 'col': col.id})
+
+    def test_contingency_table_with_marginals_and_chi_square(self):
+        data = self.get(self.gender, self.likes).json()
+        self.assertEqual([option['text'] for option in data['col_options']], ['Да', 'Нет', 'Не знаю'])
+        self.assertEqual(data['table'], [[20, 10, 0], [5, 25, 0]])
+        self.assertEqual(data['row_totals'], [30, 30])
+        self.assertEqual(data['col_totals'], [25, 35, 0])
+        self.assertEqual(data['total'], 60)
+        chi = data['chi_square']
+        self.assertEqual(chi['dof'], 1)  # пустой столбец «Не знаю» не учитывается
+        self.assertAlmostEqual(chi['statistic'], 15.428571, places=5)
+        self.assertAlmostEqual(chi['p_value'], 8.6e-05, places=6)
+        self.assertAlmostEqual(chi['cramers_v'], 0.507093, places=5)
+
+    def test_chi_square_survival_function(self):
+        for statistic, dof, expected in [(3.841459, 1, 0.05), (5.991465, 2, 0.05), (10, 5, 0.075235), (0.5, 3, 0.918891)]:
+            self.assertAlmostEqual(crosstab._chi2_sf(statistic, dof), expected, places=5)
+
+    def test_cached_per_version(self):
+        self.get(self.gender, self.likes)
+        with self.assertNumQueries(5):  # сессия, пользователь, опрос, вопросы, варианты; подсчёт пар — из кэша
+            self.get(self.gender, self.likes)
+        user = User.objects.create_user(username='late')
+        submissions.save_responses([UserResponse(question=self.gender, selected_option=self.male, user=user),
+                                    UserResponse(question=self.likes, selected_option=self.unsure, user=user)])
+        self.assertEqual(self.get(self.gender, self.likes).json()['table'][0], [20, 10, 1])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'row': self.gender.id}).status_code, 400)
+        self.assertEqual(self.get(self.gender, self.text).status_code, 400)
+        foreign = Question.objects.create(
+            survey=Survey.objects.create(title='Other', start_date=timezone.now().date(), end_date=timezone.now().date()),
+            text='Чужой', question_type='single')
+        self.assertEqual(self.get(self.gender, foreign).status_code, 404)
+
+
+class ResponseTimelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.client.force_login(self.user)
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Timeline', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='single')
+        self.yes, self.no = [AnswerOption.objects.create(question=self.question, text=t) for t in ('Да', 'Нет')]
+        self.text_question = Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+        self.url = reverse('survey-timeline', kwargs={'survey_id': self.survey.id})
+
+    def at(self, hour, minute, option=None):
+        moment = datetime(2026, 10, 18, hour, minute, 30, tzinfo=dt_timezone.utc)
+        if option is None:
+            return UserResponse(question=self.text_question, user=self.user, text_response='ок', submitted_at=moment)
+        return UserResponse(question=self.question, user=self.user, selected_option=option, submitted_at=moment)
+
+    def counts(self, granularity):
+        return [(row['bucket'].strftime('%d %H:%M'), row['responses'])
+                for row in rollups.timeline(self.survey.id, granularity)]
+
+    def test_rollups_are_maintained_at_submit_time(self):
+        submissions.save_responses([self.at(10, 1, self.yes), self.at(10, 1), self.at(10, 2, self.no), self.at(11, 59)])
+        self.assertEqual(self.counts('minute'), [('18 10:01', 2), ('18 10:02', 1), ('18 11:59', 1)])
+        self.assertEqual(self.counts('hour'), [('18 10:00', 3), ('18 11:00', 1)])
+        self.assertEqual(self.counts('day'), [('18 00:00', 4)])
+        submissions.save_responses([self.at(10, 1, self.no)])  # тот же интервал — прибавляется к строке
+        self.assertEqual(ResponseRollup.objects.get(question=self.question, granularity='minute',
+                                                    bucket=datetime(2026, 10, 18, 10, 1, tzinfo=dt_timezone.utc)).count, 2)
+
+    def test_timeline_endpoint_reads_rollups(self):
+        submissions.save_responses([self.at(10, 1, self.yes), self.at(10, 1), self.at(12, 5, self.no)])
+        with self.assertNumQueries(4):  # сессия, пользователь, опрос, счётчики
+            data = self.client.get(self.url, {'granularity': 'hour'}).json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual([(row['bucket'], row['responses']) for row in data['buckets']],
+                         [('2026-10-18T10:00:00Z', 2), ('2026-10-18T12:00:00Z', 1)])
+        self.assertEqual(data['peak']['bucket'], '2026-10-18T10:00:00Z')
+        data = self.client.get(self.url, {'granularity': 'minute', 'question': self.question.id,
+                                          'since': '2026-10-18T10:30:00', 'until': '2026-10-19'}).json()
+        self.assertEqual([row['bucket'] for row in data['buckets']], ['2026-10-18T12:05:00Z'])
+        self.assertEqual(self.client.get(self.url, {'granularity': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': 'вчера'}).status_code, 400)
+
+    def test_deleted_responses_and_options_leave_the_rollups(self):
+        created = submissions.save_responses([self.at(10, 1, self.yes), self.at(10, 1, self.no), self.at(10, 2, self.no)])
+        self.client.delete(reverse('responses-detail', kwargs={'pk': created[0].id}))
+        self.assertEqual(self.counts('minute'), [('18 10:01', 1), ('18 10:02', 1)])
+        self.no.delete()
+        self.assertEqual(self.counts('day'), [])
+
+    def test_update_keeps_the_original_bucket(self):
+        created = submissions.save_responses([self.at(10, 1, self.yes)])
+        response = self.client.patch(reverse('responses-detail', kwargs={'pk': created[0].id}),
+                                     {'selected_option': self.no.id}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts('minute'), [('18 10:01', 1)])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        submissions.save_responses([self.at(10, 1, self.yes), self.at(10, 1), self.at(23, 59, self.no)])
+        incremental = {granularity: self.counts(granularity) for granularity in rollups.GRANULARITIES}
+        ResponseRollup.objects.all().delete()
+        tallies.rebuild()
+        self.assertEqual({granularity: self.counts(granularity) for granularity in rollups.GRANULARITIES}, incremental)
+
+    @override_settings(INGESTION_MODE='buffered')
+    def test_buffered_responses_keep_the_queue_time(self):
+        with tempfile.TemporaryDirectory() as spool, override_settings(INGESTION_SPOOL_DIR=spool):
+            queued = datetime(2026, 10, 18, 9, 15, tzinfo=dt_timezone.utc)
+            with mock.patch.object(ingest.time, 'time', return_value=queued.timestamp()):
+                ingest.enqueue([self.at(10, 1, self.yes)])
+            with self.assertLogs('survey.ingest', level='INFO'):
+                ingest.flush()
+        self.assertEqual(UserResponse.objects.get().submitted_at, queued)
+        self.assertEqual(self.counts('minute'), [('18 09:15', 1)])
+
+
+class SignedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        authentication.clear_principals()
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Token', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.client = APIClient()
+
+    def token_for(self, username, password):
+        response = self.client.post(reverse('api_token'), {'username': username, 'password': password}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['token']
+
+    def bearer(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def test_token_is_issued_without_session(self):
+        response = self.client.post(reverse('api_token'), {'username': 'testuser', 'password': 'test123'}, format='json')
+        self.assertEqual(response.data['expires_in'], 7 * 24 * 3600)
+        self.assertNotIn('sessionid', response.cookies)
+        bad = self.client.post(reverse('api_token'), {'username': 'testuser', 'password': 'wrong'}, format='json')
+        self.assertEqual(bad.status_code, 400)
+
+    def test_steady_state_reads_need_no_auth_queries(self):
+        client = self.bearer(self.token_for('testuser', 'test123'))
+        url = reverse('surveys-detail', kwargs={'pk': self.survey.id})
+        with self.assertNumQueries(3):  # пользователь при первом обращении, версия опроса, опрос
+            self.assertEqual(client.get(url).status_code, 200)
+        with self.assertNumQueries(2):
+            self.assertEqual(client.get(url).status_code, 200)
+
+    def test_invalid_or_expired_token_is_rejected(self):
+        token = self.token_for('testuser', 'test123')
+        response = self.bearer(token[:-2] + 'xx').get(reverse('surveys-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+        with override_settings(API_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.bearer(token).get(reverse('surveys-list')).status_code, 401)
+
+    def test_password_reset_revokes_tokens(self):
+        client = self.bearer(self.token_for('testuser', 'test123'))
+        self.assertEqual(client.get(reverse('surveys-list')).status_code, 200)
+        admin = self.bearer(self.token_for('admin', 'admin123'))
+        response = admin.post(reverse('reset-password'), {'user_id': self.user.id, 'new_password': 'reset789'},
+                              format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get(reverse('surveys-list')).status_code, 401)
+        self.assertEqual(self.bearer(self.token_for('testuser', 'reset789')).get(reverse('surveys-list')).status_code, 200)
+
+    def test_changed_permissions_are_seen_immediately(self):
+        admin = self.bearer(self.token_for('admin', 'admin123'))
+        data = {'title': 'Новый', 'start_date': '2025-03-01', 'end_date': '2025-03-10'}
+        self.assertEqual(admin.post(reverse('surveys-list'), data, format='json').status_code, 201)
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertEqual(admin.post(reverse('surveys-list'), data, format='json').status_code, 403)
+
+    def test_async_endpoints_accept_tokens(self):
+        token = self.token_for('testuser', 'test123')
+        url = reverse('async-survey-list')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}').status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer broken').status_code, 403)
+
+
+class SubmissionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.client.force_login(self.user)
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Once', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.question = Question.objects.create(survey=self.survey, text='Q1', question_type='single')
+        self.option = AnswerOption.objects.create(question=self.question, text='Да')
+        self.url = reverse('submit_response', kwargs={'survey_id': self.survey.id})
+        self.data = {f'option_{self.question.id}': self.option.id}
+
+    def test_second_submission_is_rejected(self):
+        self.assertRedirects(self.client.post(self.url, self.data), reverse('survey_list'))
+        response = self.client.post(self.url, self.data, follow=True)
+        self.assertRedirects(response, reverse('survey_detail', kwargs={'survey_id': self.survey.id}))
+        self.assertContains(response, 'Вы уже прошли этот опрос.')
+        submission = Submission.objects.get(survey=self.survey, user=self.user)
+        self.assertEqual(list(UserResponse.objects.values_list('submission_id', flat=True)), [submission.id])
+        self.assertEqual(UserResponse.objects.get().submitted_at, submission.created_at)
+        self.assertEqual(QuestionTally.objects.get(question=self.question).responses, 1)
+
+    def test_respondents_come_from_submissions(self):
+        other = User.objects.create_user(username='other', password='test123')
+        for user in (self.user, other):
+            self.client.force_login(user)
+            self.client.post(self.url, self.data)
+        # Ответы по одному через API дополняют отправку, а не добавляют респондента
+        extra = Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+        api = APIClient()
+        api.force_authenticate(other)
+        self.assertEqual(api.post(reverse('responses-list'), {'question': extra.id,
+                                                              'text_response': 'ещё'}).status_code, 201)
+        self.assertEqual(Submission.objects.get(user=other).responses.count(), 2)
+        stats = self.client.get(reverse('survey-statistics', kwargs={'survey_id': self.survey.id})).json()
+        self.assertEqual((stats['respondents'], stats['total_responses']), (2, 3))
+        results = self.client.get(reverse('survey_results', kwargs={'survey_id': self.survey.id}))
+        self.assertContains(results, 'Респондентов: 2')
+
+    def test_api_does_not_repeat_submitted_answers(self):
+        self.client.post(self.url, self.data)
+        api = APIClient()
+        api.force_authenticate(self.user)
+        url = reverse('responses-list')
+        response = api.post(url, {'question': self.question.id, 'selected_option': self.option.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['question'], ['Вы уже ответили на этот вопрос.'])
+        multiple = Question.objects.create(survey=self.survey, text='Q2', question_type='multiple')
+        first, second = AnswerOption.objects.bulk_create(
+            [AnswerOption(question=multiple, text='A'), AnswerOption(question=multiple, text='B')])
+        self.assertEqual(api.post(url, {'question': multiple.id, 'selected_option': first.id}).status_code, 201)
+        self.assertEqual(api.post(url, {'question': multiple.id, 'selected_option': second.id}).status_code, 201)
+        self.assertEqual(api.post(url, {'question': multiple.id, 'selected_option': first.id}).status_code, 400)
+        self.assertEqual(UserResponse.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(QuestionTally.objects.get(question=self.question).responses, 1)
+
+    def test_batch_responses_join_the_users_submission(self):
+        self.client.post(self.url, self.data)
+        admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        api = APIClient()
+        api.force_authenticate(admin)
+        extra = Question.objects.create(survey=self.survey, text='Q2', question_type='text')
+        item = {'question': extra.id, 'text_response': 'с планшета'}
+        response = api.post(reverse('survey-responses-batch', kwargs={'survey_id': self.survey.id}),
+                            {'responses': [item, dict(item, user=self.user.id)]}, format='json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Submission.objects.get(user=self.user).responses.count(), 2)
+        self.assertEqual(Submission.objects.get(user=admin).responses.count(), 1)
+        self.assertEqual(Survey.objects.with_respondents().get(id=self.survey.id).respondents, 2)
+
+
+class ColumnarSnapshotTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        today = timezone.now().date()
+        self.survey = Survey.objects.create(title='Snapshot', start_date=today, end_date=today + timezone.timedelta(days=5))
+        self.likes = Question.objects.create(survey=self.survey, text='Нравится?', question_type='single')
+        self.yes, self.no = [AnswerOption.objects.create(question=self.likes, text=t) for t in ('Да', 'Нет')]
+        self.why = Question.objects.create(survey=self.survey, text='Почему?', question_type='text')
+        self.users = [User.objects.create_user(username=f'respondent{i}', password='x') for i in range(2)]
+        moment = datetime(2026, 10, 18, 10, 0, tzinfo=dt_timezone.utc)
+        submissions.save_responses([
+            UserResponse(question=self.likes, selected_option=self.yes, user=self.users[0], submitted_at=moment),
+            UserResponse(question=self.why, text_response='удобно', user=self.users[0], submitted_at=moment),
+            UserResponse(question=self.likes, selected_option=self.no, user=self.users[1], submitted_at=moment),
+            UserResponse(question=self.likes, selected_option=self.yes, submitted_at=moment),
+            UserResponse(question=self.likes, selected_option=self.yes, user=self.users[1], submitted_at=moment),
+        ])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_columns_are_integer_coded(self):
+        labels = snapshots.write_snapshot(self.survey, self.directory, chunk_size=2)
+        columns, loaded = snapshots.load_snapshot(self.directory)
+        self.assertEqual(loaded, labels)
+        self.assertEqual(labels['rows'], 5)
+        self.assertEqual(list(columns['question']), [0, 1, 0, 0, 0])
+        self.assertEqual(list(columns['option']), [0, -1, 1, 0, 0])
+        self.assertEqual(list(columns['respondent']), [0, 0, 1, -1, 1])
+        self.assertEqual(labels['respondents'], [user.id for user in self.users])
+        self.assertEqual(set(columns['submitted_at']), {int(datetime(2026, 10, 18, 10, tzinfo=dt_timezone.utc).timestamp())})
+        self.assertEqual([option['text'] for option in labels['options']], ['Да', 'Нет'])
+
+    def test_npy_header_follows_the_format(self):
+        snapshots.write_snapshot(self.survey, self.directory)
+        with open(f'{self.directory}/option.npy', 'rb') as column:
+            data = column.read()
+        self.assertTrue(data.startswith(b'\x93NUMPY\x01\x00'))
+        header_length = int.from_bytes(data[8:10], 'little')
+        self.assertEqual((10 + header_length) % 64, 0)
+        self.assertIn(b"'descr': '<i4', 'fortran_order': False, 'shape': (5,)", data[10:10 + header_length])
+        self.assertEqual(len(data), 10 + header_length + 5 * 4)
+
+    def test_option_tallies_match_the_materialized_counters(self):
+        snapshots.write_snapshot(self.survey, self.directory)
+        expected = {option.id: option.tally.count for option in AnswerOption.objects.filter(question=self.likes)}
+        self.assertEqual(snapshots.option_tallies(self.directory), expected)
+        self.assertEqual(expected, {self.yes.id: 3, self.no.id: 1})
+
+    @unittest.skipUnless(snapshots.numpy, "NumPy не установлен")
+    def test_numpy_reads_the_snapshot(self):
+        snapshots.write_snapshot(self.survey, self.directory)
+        self.assertEqual(snapshots.numpy.load(f'{self.directory}/respondent.npy').tolist(), [0, 0, 1, -1, 1])
+
+    def test_empty_survey(self):
+        survey = Survey.objects.create(title='Пустой', start_date=self.survey.start_date, end_date=self.survey.end_date)
+        snapshots.write_snapshot(survey, self.directory)
+        columns, labels = snapshots.load_snapshot(self.directory)
+        self.assertEqual((labels['rows'], len(columns['option'])), (0, 0))
+
+    def test_endpoint_returns_npz_archive(self):
+        url = reverse('survey-snapshot', kwargs={'survey_id': self.survey.id})
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('survey-%d-snapshot.npz' % self.survey.id, response['Content-Disposition'])
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()),
+                         ['labels.json', 'option.npy', 'question.npy', 'respondent.npy', 'submitted_at.npy'])
+        self.assertEqual(json.loads(archive.read('labels.json'))['rows'], 5)
+
+    def test_command_writes_directory_and_archive(self):
+        out = StringIO()
+        archive = f'{self.directory}/snapshot.npz'
+        call_command('export_snapshot', str(self.survey.id), '--output', f'{self.directory}/snap',
+                     '--archive', archive, stdout=out)
+        self.assertIn('ответов 5', out.getvalue())
+        self.assertEqual(snapshots.option_tallies(f'{self.directory}/snap'), {self.yes.id: 3, self.no.id: 1})
+        self.assertIn('option.npy', zipfile.ZipFile(archive).namelist())
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        User.objects.bulk_create(
+            [User(username=f'respondent{i:03d}', email=f'r{i}@example.com') for i in range(120)]
+            + [User(username='Ivanov', email='boss@Corp.example'), User(username='petrov', email='IVAN@example.com')]
+        )
+        self.client.force_login(self.admin)
+
+    def usernames(self, query=''):
+        return sorted(users.matching(query).values_list('username', flat=True))
+
+    def test_prefix_matches_username_or_email_case_insensitively(self):
+        self.assertEqual(self.usernames('ivan'), ['Ivanov', 'petrov'])
+        self.assertEqual(self.usernames('  BOSS@corp'), ['Ivanov'])
+        self.assertEqual(self.usernames('respondent11'), [f'respondent{i}' for i in range(110, 120)])
+        self.assertEqual(self.usernames('nobody'), [])
+        self.assertEqual(len(self.usernames()), 123)
+
+    def test_punctuation_and_edge_characters(self):
+        User.objects.bulk_create([User(username=name) for name in
+                                  ('john.smith', 'johnsmith', 'john-', 'a_b', 'axb', 'z\U0010ffff', 'y\ud7ffq')])
+        self.assertEqual(self.usernames('john.'), ['john.smith'])
+        self.assertEqual(self.usernames('a_b'), ['a_b'])
+        self.assertEqual(self.usernames('z\U0010ffff'), ['z\U0010ffff'])
+        self.assertEqual(self.usernames('y\ud7ff'), ['y\ud7ffq'])
+        self.assertEqual(users._successor('a\U0010ffff'), 'b')
+        self.assertEqual(users._successor('\ud7ff'), '\ue000')
+        self.assertIsNone(users._successor('\U0010ffff'))
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN в формате SQLite")
+    def test_search_uses_functional_indexes(self):
+        sql, params = users.matching('ivan').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertNotIn('SCAN auth_user', plan)
+        self.assertTrue(any('survey_user_username_lower' in step for step in plan), plan)
+        self.assertTrue(any('survey_user_email_lower' in step for step in plan), plan)
+
+    def test_api_pages_by_cursor(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url, names = reverse('users-list') + '?page_size=50', []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(response.data['results']), 50)
+                names.extend(user['username'] for user in response.data['results'])
+                url = response.data['next']
+        self.assertEqual(names, sorted(User.objects.values_list('username', flat=True)))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+        response = client.get(reverse('users-list'), {'q': 'IVAN'})
+        self.assertEqual([user['username'] for user in response.data['results']], ['Ivanov', 'petrov'])
+
+    def test_manage_users_page_is_paginated_and_searchable(self):
+        response = self.client.get(reverse('manage_users'))
+        self.assertEqual(len(response.context['users']), UserCursorPagination.page_size)
+        self.assertIsNone(response.context['previous_link'])
+        response = self.client.get(response.context['next_link'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.context['previous_link'])
+        response = self.client.get(reverse('manage_users'), {'q': 'boss'})
+        self.assertEqual([user.username for user in response.context['users']], ['Ivanov'])
+        self.assertContains(response, 'value="boss"')
+        self.assertIsNone(response.context['next_link'])
+        self.assertEqual(self.client.get(reverse('manage_users'), {'cursor': 'garbage'}).status_code, 404)
+
+
+class SurveyListPaginationTests(TestCase):
+    def setUp(self):
+        self.surveys = Survey.objects.bulk_create([
+            Survey(title=f'Опрос {i}', description='x' * 5000, start_date=date(2025, 1, 1 + i % 20),
+                   end_date=date(2025, 2, 1)) for i in range(60)
+        ])
+        self.question = Question.objects.create(survey=self.surveys[7], text='Как вам доставка?', question_type='text')
+        Question.objects.bulk_create([
+            Question(survey=self.surveys[0], text=f'Вопрос о доставке {i}', question_type='text') for i in range(80)
+        ])
+
+    def collect_titles(self, url):
+        titles = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.context['surveys']), SurveyCursorPagination.page_size)
+            titles.extend(survey.title for survey in response.context['surveys'])
+            url = response.context['next_link']
+        return titles
+
+    def test_pages_cover_every_survey_in_sort_order(self):
+        for sort in ('start_date', '-start_date'):
+            expected = [survey.title for survey in Survey.objects.order_by(sort, sort.replace('start_date', 'id'))]
+            self.assertEqual(self.collect_titles(reverse('survey_list') + f'?sort={sort}'), expected)
+
+    def test_description_is_a_truncated_preview(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('survey_list'))
+        self.assertNotIn('questions', response.context)
+        sql = queries.captured_queries[0]['sql']
+        self.assertEqual(sql.count('"description"'), 1)
+        self.assertIn('SUBSTR("survey_survey"."description", 1, 201)', sql)
+        preview = response.context['surveys'][0].description_preview
+        self.assertEqual(len(preview), response.context['preview_length'] + 1)
+        self.assertNotContains(response, 'x' * 300)
+
+    def test_filter_by_question(self):
+        response = self.client.get(reverse('survey_list'), {'question': self.question.id})
+        self.assertEqual([survey.title for survey in response.context['surveys']], ['Опрос 7'])
+        self.assertContains(response, 'Как вам доставка?')
+        self.assertEqual(self.client.get(reverse('survey_list'), {'cursor': 'bad'}).status_code, 404)
+
+    def test_question_autocomplete_is_bounded(self):
+        url = reverse('question-autocomplete')
+        response = self.client.get(url, {'q': 'доставк'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.data[0], {'id': self.question.id, 'text': 'Как вам доставка?',
+                                            'survey': self.surveys[7].id, 'survey_title': 'Опрос 7'})
+        self.assertEqual(len(self.client.get(url, {'q': 'доставке', 'limit': 50}).data), 50)
+        self.assertEqual(self.client.get(url, {'limit': 500}).status_code, 400)
+        self.assertEqual([question['id'] for question in self.client.get(url, {'q': 'как ВАМ'}).data],
+                         [self.question.id])
+        self.assertEqual(len(self.client.get(url, {'q': 'ВОПРОС О', 'limit': 50}).data), 50)
+        with self.assertNumQueries(1):
+            self.client.get(url, {'q': 'Как'})
@@ -32,11 +32,25 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/register/', RegisterView.as_view(), name='api_register'),
     path('api/login/', LoginView.as_view(), name='api_login'),
+    path('api/token/', TokenView.as_view(), name='api_token'),
     path('api/logout/', LogoutView.as_view(), name='api_logout'),
     path('api/change-password/', ChangePasswordView.as_view(), name='change-password'),
     path('api/reset-password/', ResetPasswordView.as_view(), name='reset-password'),
+    path('api/autocomplete/questions/', QuestionAutocompleteView.as_view(), name='question-autocomplete'),
     path('api/surveys/<int:survey_id>/statistics/', SurveyStatisticsView.as_view(), name='survey-statistics'),
+    path('api/surveys/<int:survey_id>/crosstab/', SurveyCrosstabView.as_view(), name='survey-crosstab'),
     path('api/surveys/<int:survey_id>/questions/', SurveyQuestionsView.as_view(), name='survey-questions'),
+    path('api/surveys/<int:survey_id>/definition/', SurveyDefinitionView.as_view(), name='survey-definition'),
     path('api/surveys/<int:survey_id>/answers/', SurveyAnswersView.as_view(), name='survey-answers'),
     path('api/surveys/<int:survey_id>/questions/<int:question_id>/answers/', SurveyAnswersByQuestionView.as_view(), name='survey-answers-by-question'),
+    path('api/surveys/<int:survey_id>/timeline/', SurveyTimelineView.as_view(), name='survey-timeline'),
+    path('api/surveys/<int:survey_id>/search/', SurveyTextSearchView.as_view(), name='survey-search'),
+    path('api/surveys/<int:survey_id>/export/', SurveyExportView.as_view(), name='survey-export'),
+    path('api/surveys/<int:survey_id>/snapshot/', SurveySnapshotView.as_view(), name='survey-snapshot'),
+    path('api/surveys/<int:survey_id>/responses/batch/', SurveyResponseBatchView.as_view(), name='survey-responses-batch'),
+
+    path('api/async/surveys/', async_survey_list, name='async-survey-list'),
+    path('api/async/surveys/<int:survey_id>/questions/', async_survey_questions, name='async-survey-questions'),
+    path('api/async/surveys/<int:survey_id>/statistics/', async_survey_statistics, name='async-survey-statistics'),
+    path('api/async/surveys/<int:survey_id>/answers/', async_survey_answers, name='async-survey-answers'),
 ]
\ No newline at end of file
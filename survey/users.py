@@ -0,0 +1,47 @@
+"""Список пользователей для админки и API: поиск по началу имени или email через индексы lower(...)"""
+import sys
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+def _fold(prefix):
+    # lower() в SQLite переводит в нижний регистр только ASCII: префикс приводится так же, как значения в индексе
+    if connection.vendor == 'sqlite':
+        return ''.join(char.lower() if char.isascii() else char for char in prefix)
+    return prefix.lower()
+
+
+def _successor(prefix):
+    """Наименьшая строка, которая больше любой строки, начинающейся с prefix; None — такой нет"""
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if code == 0xD800:
+            code = 0xE000  # суррогаты не бывают отдельными символами
+        if code <= sys.maxunicode:
+            return prefix[:-1] + chr(code)
+        prefix = prefix[:-1]  # за U+10FFFF символа нет — увеличивается предыдущий
+    return None
+
+
+def _starts_with(field, prefix):
+    if connection.vendor != 'sqlite':
+        # PostgreSQL: LIKE 'prefix%' по индексу text_pattern_ops — побайтовое сравнение при любой сортировке базы
+        return Q(**{f'{field}__startswith': prefix})
+    # SQLite сравнивает строки побайтово (BINARY): префикс — диапазон [prefix, следующая строка),
+    # по нему работает индекс, а LIKE 'prefix%' — нет
+    upper = _successor(prefix)
+    condition = Q(**{f'{field}__gte': prefix})
+    return condition & Q(**{f'{field}__lt': upper}) if upper is not None else condition
+
+
+def matching(query=''):
+    """Пользователи, у которых имя или email начинается с query (без учёта регистра); пустой query — все"""
+    users = User.objects.all()
+    prefix = _fold(query.strip())
+    if prefix:
+        users = users.alias(username_lower=Lower('username'), email_lower=Lower('email')).filter(
+            _starts_with('username_lower', prefix) | _starts_with('email_lower', prefix))
+    return users
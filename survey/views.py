@@ -1,7 +1,13 @@
+import math
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from rest_framework import viewsets, generics, status, permissions
+from rest_framework.exceptions import NotFound, ValidationError as APIValidationError
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import authenticate, logout, login
@@ -9,74 +15,201 @@ from rest_framework.views import APIView
 from .serializers import *
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from collections import defaultdict
+from django.db import connection, transaction
+from django.db.models import Avg, BooleanField, Case, CharField, Count, F, Func, Max, Prefetch, Q, Value, When, Window
+from django.db.models.functions import Ceil, Length, RowNumber, Substr
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.core.exceptions import ValidationError
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from . import authentication, crosstab, definitions, exports, ingest, rollups, search, snapshots, submissions, tallies, users
+from .conditional import conditional, survey_list_stamp, survey_stamp, survey_questions_stamp
+from .pagination import ResponseCursorPagination, SearchPagination, SurveyCursorPagination, UserCursorPagination
+
+
+def _questions_with_tallies(survey_id):
+    """Вопросы опроса с вариантами ответов и счётчиками: фиксированное число запросов"""
+    return Question.objects.filter(survey_id=survey_id).order_by('id').select_related('tally').prefetch_related(
+        Prefetch('options', queryset=AnswerOption.objects.order_by('id').select_related('tally'))
+    )
+
+TEXT_SAMPLE_SIZE = 20
+TEXT_SAMPLE_MAX = 100
+TEXT_LENGTH_PERCENTILES = (0.5, 0.9)
+
+def _text_ids(questions):
+    return [question.id for question in questions if question.question_type == 'text']
+
+def _nonempty_text_answers(questions):
+    return (UserResponse.objects.filter(question_id__in=_text_ids(questions))
+            .exclude(text_response__isnull=True).exclude(text_response=''))
+
+def _sample_size(value):
+    """Размер выборки текстовых ответов из параметра запроса, в пределах [0, TEXT_SAMPLE_MAX]"""
+    try:
+        return min(max(int(value), 0), TEXT_SAMPLE_MAX)
+    except (TypeError, ValueError):
+        return TEXT_SAMPLE_SIZE
+
+def _text_answers_query(questions, limit=TEXT_SAMPLE_SIZE):
+    """Последние limit текстовых ответов на каждый текстовый вопрос, одним запросом (оконная функция)"""
+    return (_nonempty_text_answers(questions)
+            .annotate(newest=Window(RowNumber(), partition_by=F('question_id'), order_by=F('id').desc()))
+            .filter(newest__lte=limit)
+            .order_by('question_id', '-id').values_list('question_id', 'text_response'))
+
+def _text_lengths_query(questions):
+    """Длины текстовых ответов по вопросам (число, среднее, максимум, перцентили) в SQL: по строке на перцентиль"""
+    by_question = {'partition_by': F('question_id')}
+    is_percentile = Q()
+    for fraction in TEXT_LENGTH_PERCENTILES:
+        is_percentile |= Q(position=Ceil(F('total') * fraction))
+    return (_nonempty_text_answers(questions)
+            .annotate(length=Length('text_response'),
+                      position=Window(RowNumber(), order_by=[Length('text_response').asc(), F('id').asc()],
+                                      **by_question),
+                      total=Window(Count('id'), **by_question),
+                      mean=Window(Avg(Length('text_response')), **by_question),
+                      longest=Window(Max(Length('text_response')), **by_question))
+            .annotate(is_percentile=Case(When(is_percentile, then=Value(True)), default=Value(False),
+                                         output_field=BooleanField()))
+            .filter(is_percentile=True).order_by()
+            .values_list('question_id', 'position', 'total', 'mean', 'longest', 'length'))
+
+def _group_text_answers(rows):
+    """Группирует пары (question_id, текст) по вопросу"""
+    answers = defaultdict(list)
+    for question_id, text in rows:
+        answers[question_id].append(text)
+    return answers
+
+def _group_text_lengths(rows):
+    """Собирает строки _text_lengths_query в {question_id: {count, mean, p50, p90, max}}"""
+    lengths = {}
+    for question_id, position, total, mean, longest, length in rows:
+        entry = lengths.setdefault(question_id, {'count': total, 'mean': round(mean, 1), 'max': longest})
+        for fraction in TEXT_LENGTH_PERCENTILES:
+            if math.ceil(total * fraction) == position:
+                entry[f'p{round(fraction * 100)}'] = length
+    return lengths
+
+def _build_statistics(questions, text_answers, text_lengths, respondents):
+    """Статистика опроса по загруженным вопросам и счётчикам, без обращений к БД"""
+    stats = {
+        'respondents': respondents,
+        'total_responses': sum(tallies.tally_value(question, 'responses') for question in questions),
+        'by_question': {}
+    }
+    for question in questions:
+        if question.question_type in ['single', 'multiple']:
+            options_count = {
+                option.text: tallies.tally_value(option, 'count')
+                for option in question.options.all()
+            }
+            stats['by_question'][question.text] = {
+                'type': question.question_type,
+                'responses': tallies.tally_value(question, 'responses'),
+                'options': options_count
+            }
+        else:
+            lengths = text_lengths.get(question.id)
+            stats['by_question'][question.text] = {
+                'type': 'text',
+                'responses': tallies.tally_value(question, 'responses'),
+                'answers': text_answers[question.id],
+                'answers_total': lengths['count'] if lengths else 0,
+                'length': {key: value for key, value in lengths.items() if key != 'count'} if lengths else None,
+                'answers_url': reverse('survey-answers-by-question',
+                                       kwargs={'survey_id': question.survey_id, 'question_id': question.id}),
+            }
+    return stats
+
+DESCRIPTION_PREVIEW_LENGTH = 200
 
 # HTML Views
 def survey_list(request):
-    """Отображает список всех опросов с фильтрацией и сортировкой"""
-    surveys = Survey.objects.all()
-    for survey in surveys:
-        survey.update_status()  # Обновляем статус перед отображением
-    question_id = request.GET.get('question')
-    if question_id:
+    """Отображает список опросов постранично, с фильтрацией по вопросу и сортировкой"""
+    # Только поля карточки; от описания в строку попадает начало, а не весь текст
+    surveys = Survey.objects.with_status().only('title', 'start_date', 'end_date').annotate(
+        description_preview=Substr('description', 1, DESCRIPTION_PREVIEW_LENGTH + 1))
+    question_id = request.GET.get('question', '')
+    question = None
+    if question_id.isdigit():
+        # Варианты фильтра подгружает автодополнение; здесь — только выбранный вопрос
+        question = Question.objects.filter(id=question_id).values('id', 'text').first()
         surveys = surveys.filter(questions__id=question_id)
     sort_by = request.GET.get('sort', 'start_date')
-    if sort_by in ['start_date', '-start_date', 'end_date', '-end_date']:
-        surveys = surveys.order_by(sort_by)
-    else:
-        surveys = surveys.order_by('start_date')
-    questions = Question.objects.all()
-    return render(request, 'survey_list.html', {'surveys': surveys, 'questions': questions})
+    if sort_by not in ['start_date', '-start_date', 'end_date', '-end_date']:
+        sort_by = 'start_date'
+    paginator = SurveyCursorPagination()
+    paginator.ordering = (sort_by, '-id' if sort_by.startswith('-') else 'id')
+    try:
+        page = paginator.paginate_queryset(surveys, Request(request))
+    except NotFound:
+        raise Http404("Некорректный курсор.")
+    return render(request, 'survey_list.html', {
+        'surveys': page, 'question': question, 'preview_length': DESCRIPTION_PREVIEW_LENGTH,
+        'next_link': paginator.get_next_link(), 'previous_link': paginator.get_previous_link(),
+    })
+
+def _survey_detail_context(survey):
+    """Контекст страницы опроса: вопросы с вариантами грузятся лениво, только при промахе кэша"""
+    questions = survey.questions.order_by('id').prefetch_related(
+        Prefetch('options', queryset=AnswerOption.objects.order_by('id'))
+    )
+    return {'survey': survey, 'questions': questions}
 
 @login_required(login_url='/login/')
 def survey_detail(request, survey_id):
     """Отображает детали конкретного опроса"""
-    survey = Survey.objects.get(id=survey_id)
-    survey.update_status()
-    return render(request, 'survey_detail.html', {'survey': survey})
+    survey = Survey.objects.with_status().get(id=survey_id)
+    return render(request, 'survey_detail.html', _survey_detail_context(survey))
 
 @login_required(login_url='/login/')
 def survey_results(request, survey_id):
     """Отображает результаты опроса для всех зарегистрированных пользователей"""
-    survey = Survey.objects.get(id=survey_id)
-    survey.update_status()
+    survey = Survey.objects.with_respondents().get(id=survey_id)
+    questions = list(_questions_with_tallies(survey.id))
+    text_answers = _group_text_answers(_text_answers_query(questions))
+    text_lengths = _group_text_lengths(_text_lengths_query(questions))
     results = {}
-    for question in survey.questions.all():
-        responses = UserResponse.objects.filter(question=question)
+    for question in questions:
         if question.question_type in ['single', 'multiple']:
-            options_stats = {option.text: responses.filter(selected_option=option).count()
+            options_stats = {option.text: tallies.tally_value(option, 'count')
                             for option in question.options.all()}
             results[question.text] = {'type': question.question_type, 'stats': options_stats}
         else:
-            text_answers = [r.text_response for r in responses if r.text_response]
-            results[question.text] = {'type': 'text', 'answers': text_answers}
+            lengths = text_lengths.get(question.id)
+            results[question.text] = {'type': 'text', 'answers': text_answers[question.id],
+                                      'total': lengths['count'] if lengths else 0}
     return render(request, 'survey_results.html', {'survey': survey, 'results': results})
 
 @login_required(login_url='/login/')
 def submit_response(request, survey_id):
     """Обрабатывает отправку ответов на опрос"""
-    survey = Survey.objects.get(id=survey_id)
-    survey.update_status()
-    if not survey.is_active:
+    survey = Survey.objects.with_status().get(id=survey_id)
+    if not survey.is_open:
         messages.error(request, "Этот опрос завершён, ответы больше не принимаются.")
         return redirect('survey_list')
 
     if request.method == 'POST':
-        for question in survey.questions.all():
-            response_data = {'question': question, 'user_id': request.user.id}
-            if question.question_type == 'text':
-                text = request.POST.get(f'text_{question.id}')
-                if text:
-                    response_data['text_response'] = text
-                    UserResponse.objects.create(**response_data)
+        try:
+            responses = submissions.build_responses(list(survey.questions.all()), request.POST, request.user.id)
+            if not ingest.is_buffered():
+                submissions.save_submission(survey, request.user.id, responses)
+            elif submissions.has_submitted(survey.id, request.user.id):
+                # Повторы, ещё не перенесённые из буфера, отбрасывает ingest_worker
+                raise ValidationError(submissions.ALREADY_SUBMITTED)
             else:
-                option_ids = request.POST.getlist(f'option_{question.id}')
-                for option_id in option_ids:
-                    option = AnswerOption.objects.get(id=option_id)
-                    response_data['selected_option'] = option
-                    UserResponse.objects.create(**response_data)
+                ingest.enqueue(responses)
+        except ValidationError as error:
+            messages.error(request, error.message)
+            return redirect('survey_detail', survey_id=survey.id)
         messages.success(request, "Ваши ответы успешно отправлены!")
         return redirect('survey_list')
-    return render(request, 'survey_detail.html', {'survey': survey})
+    return render(request, 'survey_detail.html', _survey_detail_context(survey))
 
 def login_view(request):
     """Логин через HTML-форму"""
@@ -208,8 +341,7 @@ def delete_survey(request, survey_id):
 @login_required
 @user_passes_test(admin_required)
 def manage_users(request):
-    """Управление пользователями через HTML"""
-    users = User.objects.all()
+    """Управление пользователями через HTML: поиск по началу имени или email, страницы по 50"""
     if request.method == 'POST':
         action = request.POST.get('action')
         user_id = request.POST.get('user_id')
@@ -224,7 +356,17 @@ def manage_users(request):
                 user.set_password(request.POST.get('password'))
             user.save()
             messages.success(request, "Пользователь обновлен успешно!")
-    return render(request, 'manage_users.html', {'users': users})
+    # Та же курсорная пагинация, что у /api/users/: страница не читает всю таблицу пользователей
+    paginator = UserCursorPagination()
+    query = request.GET.get('q', '')
+    try:
+        page = paginator.paginate_queryset(users.matching(query), Request(request))
+    except NotFound:
+        raise Http404("Некорректный курсор.")
+    return render(request, 'manage_users.html', {
+        'users': page, 'query': query,
+        'next_link': paginator.get_next_link(), 'previous_link': paginator.get_previous_link(),
+    })
 
 @login_required
 @user_passes_test(admin_required)
@@ -255,6 +397,12 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = UserCursorPagination
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return users.matching(self.request.query_params.get('q', ''))
+        return super().get_queryset()
 
 class SurveyViewSet(viewsets.ModelViewSet):
     """CRUD для опросов через API"""
@@ -265,6 +413,18 @@ class SurveyViewSet(viewsets.ModelViewSet):
     filterset_fields = ['questions']
     ordering_fields = ['start_date', 'end_date']
 
+    def get_queryset(self):
+        # with_status() берёт сегодняшнюю дату при вызове — на каждый запрос, а не один раз при импорте
+        return Survey.objects.with_status()
+
+    @conditional(survey_list_stamp)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(survey_stamp)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 class QuestionViewSet(viewsets.ModelViewSet):
     """CRUD для вопросов через API"""
     queryset = Question.objects.all()
@@ -282,42 +442,125 @@ class UserResponseViewSet(viewsets.ModelViewSet):
     queryset = UserResponse.objects.all()
     serializer_class = UserResponseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ResponseCursorPagination
 
     def get_queryset(self):
         return UserResponse.objects.filter(user_id=self.request.user)
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        # Ответы по одному через API дополняют отправку пользователя на этот опрос, но не повторяют её ответы
+        question = serializer.validated_data['question']
+        submission, created = Submission.objects.get_or_create(survey_id=question.survey_id, user=self.request.user)
+        if not created and submissions.already_answered(
+                submission, question, serializer.validated_data.get('selected_option')):
+            raise APIValidationError({'question': [submissions.ALREADY_ANSWERED]})
+        tallies.record_responses([serializer.save(user=self.request.user, survey_id=question.survey_id,
+                                                  submission=submission)])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        tallies.discard_responses([UserResponse(question_id=serializer.instance.question_id,
+                                                selected_option_id=serializer.instance.selected_option_id,
+                                                submitted_at=serializer.instance.submitted_at)])
+        tallies.record_responses([serializer.save()])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        tallies.discard_responses([instance])
+        instance.delete()
+
 class SurveyStatisticsView(APIView):
     """Статистика опроса через API"""
     permission_classes = [IsAdminOrReadOnly]
 
     def get(self, request, survey_id):
-        survey = Survey.objects.get(id=survey_id)
-        responses = UserResponse.objects.filter(question__survey=survey)
-        stats = {
-            'total_responses': responses.count(),
-            'by_question': {}
-        }
-        for question in survey.questions.all():
-            question_responses = responses.filter(question=question)
-            if question.question_type in ['single', 'multiple']:
-                options_count = {
-                    option.text: question_responses.filter(selected_option=option).count()
-                    for option in question.options.all()
-                }
-                stats['by_question'][question.text] = {
-                    'type': question.question_type,
-                    'responses': question_responses.count(),
-                    'options': options_count
-                }
-            else:
-                text_answers = [r.text_response for r in question_responses if r.text_response]
-                stats['by_question'][question.text] = {
-                    'type': 'text',
-                    'responses': question_responses.count(),
-                    'answers': text_answers
-                }
+        survey = Survey.objects.with_respondents().get(id=survey_id)
+        questions = list(_questions_with_tallies(survey.id))
+        sample = _sample_size(request.query_params.get('sample', TEXT_SAMPLE_SIZE))
+        stats = _build_statistics(questions, _group_text_answers(_text_answers_query(questions, sample)),
+                                  _group_text_lengths(_text_lengths_query(questions)), survey.respondents)
         return Response(stats, status=status.HTTP_200_OK)
 
+class SurveyCrosstabView(APIView):
+    """Таблица сопряжённости двух вопросов с выбором (?row=<id>&col=<id>) с маргиналами и хи-квадрат"""
+    permission_classes = [IsAdminOrReadOnly]
+
+    def get(self, request, survey_id):
+        survey = get_object_or_404(Survey, id=survey_id)
+        row_id, col_id = request.query_params.get('row', ''), request.query_params.get('col', '')
+        if not (row_id.isdigit() and col_id.isdigit()):
+            return Response({"error": "Укажите ID вопросов в параметрах row и col."}, status=400)
+        questions = {question.id: question
+                     for question in Question.objects.filter(survey=survey, id__in=[int(row_id), int(col_id)])}
+        row_question, col_question = questions.get(int(row_id)), questions.get(int(col_id))
+        if row_question is None or col_question is None:
+            return Response({"error": "Вопрос не относится к этому опросу."}, status=404)
+        if 'text' in (row_question.question_type, col_question.question_type):
+            return Response({"error": "Таблица строится только по вопросам с выбором ответа."}, status=400)
+        options_by_question = defaultdict(list)
+        for option in AnswerOption.objects.filter(question_id__in=questions).select_related('tally').order_by('id'):
+            options_by_question[option.question_id].append(option)
+        return Response(crosstab.crosstab(survey, row_question, col_question, options_by_question))
+
+class SurveyTimelineView(APIView):
+    """Динамика ответов на опрос по минутам, часам или суткам — из материализованных счётчиков"""
+    permission_classes = [IsAdminOrReadOnly]
+
+    def get(self, request, survey_id):
+        get_object_or_404(Survey, id=survey_id)
+        granularity = request.query_params.get('granularity', 'hour')
+        if granularity not in rollups.GRANULARITIES:
+            return Response({"error": "Параметр granularity: minute, hour или day."}, status=400)
+        question_id = request.query_params.get('question')
+        if question_id is not None and not question_id.isdigit():
+            return Response({"error": "Параметр question должен быть ID вопроса."}, status=400)
+        bounds = {}
+        for name in ('since', 'until'):
+            raw = request.query_params.get(name)
+            if raw is None:
+                continue
+            moment = parse_datetime(raw)
+            if moment is None:
+                day = parse_date(raw)
+                moment = datetime.combine(day, datetime.min.time()) if day else None
+            if moment is None:
+                return Response({"error": f"Параметр {name}: дата или дата и время в формате ISO 8601."}, status=400)
+            bounds[name] = moment if timezone.is_aware(moment) else timezone.make_aware(moment, dt_timezone.utc)
+        buckets = rollups.timeline(survey_id, granularity, int(question_id) if question_id else None, **bounds)
+        return Response({
+            'granularity': granularity,
+            'total': sum(bucket['responses'] for bucket in buckets),
+            'peak': max(buckets, key=lambda bucket: bucket['responses'], default=None),
+            'buckets': buckets,
+        })
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+class QuestionAutocompleteView(APIView):
+    """Подсказки для фильтра по вопросу: не больше limit вопросов, текст которых содержит q"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        limit = request.query_params.get('limit', str(AUTOCOMPLETE_LIMIT))
+        if not limit.isdigit() or not 0 < int(limit) <= AUTOCOMPLETE_MAX_LIMIT:
+            return Response({"error": f"Параметр limit: от 1 до {AUTOCOMPLETE_MAX_LIMIT}."}, status=400)
+        questions = Question.objects.order_by('id')
+        query = request.query_params.get('q', '').strip()
+        if query and connection.vendor == 'sqlite':
+            # LIKE в SQLite без учёта регистра только для латиницы: «как» должно находить «Как вам…»
+            questions = questions.alias(text_lower=Func('text', function='UNICODE_LOWER', output_field=CharField())) \
+                .filter(text_lower__contains=query.lower())
+        elif query:
+            questions = questions.filter(text__icontains=query)
+        # Выборка ограничена LIMIT: просмотр таблицы останавливается на первых limit совпадениях
+        rows = questions.values('id', 'text', 'survey_id', 'survey__title')[:int(limit)]
+        return Response([
+            {'id': row['id'], 'text': row['text'], 'survey': row['survey_id'], 'survey_title': row['survey__title']}
+            for row in rows
+        ])
+
 class SurveyQuestionsView(generics.ListAPIView):
     """Список вопросов опроса через API"""
     serializer_class = QuestionSerializer
@@ -327,25 +570,100 @@ class SurveyQuestionsView(generics.ListAPIView):
         survey_id = self.kwargs['survey_id']
         return Question.objects.filter(survey_id=survey_id)
 
+    @conditional(survey_questions_stamp)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class SurveyDefinitionView(APIView):
+    """Опрос с вопросами и вариантами ответа одним документом (для отрисовки формы на фронтенде)"""
+    permission_classes = [IsAdminOrReadOnly]
+
+    @conditional(survey_stamp)
+    def get(self, request, survey_id):
+        survey = get_object_or_404(Survey.objects.with_status(), id=survey_id)
+        return HttpResponse(definitions.definition_bytes(survey), content_type='application/json')
+
 class SurveyAnswersView(generics.ListAPIView):
     """Список ответов на опрос через API"""
     serializer_class = UserResponseSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = ResponseCursorPagination
 
     def get_queryset(self):
-        survey_id = self.kwargs['survey_id']
-        return UserResponse.objects.filter(question__survey_id=survey_id)
+        # По индексу (survey, id): страница курсора читается уже упорядоченной, без сортировки всех ответов опроса
+        return UserResponse.objects.filter(survey_id=self.kwargs['survey_id'])
 
 class SurveyAnswersByQuestionView(generics.ListAPIView):
     """Список ответов на конкретный вопрос через API"""
     serializer_class = UserResponseSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = ResponseCursorPagination
 
     def get_queryset(self):
         survey_id = self.kwargs['survey_id']
         question_id = self.kwargs['question_id']
         return UserResponse.objects.filter(question__survey_id=survey_id, question_id=question_id)
 
+class SurveyTextSearchView(generics.GenericAPIView):
+    """Полнотекстовый поиск по текстовым ответам опроса (?q=, ?question=), по убыванию релевантности"""
+    permission_classes = [IsAdminOrReadOnly]
+    pagination_class = SearchPagination
+
+    def get(self, request, survey_id):
+        get_object_or_404(Survey, id=survey_id)
+        query = request.query_params.get('q', '')
+        if not search.query_words(query):
+            return Response({"error": "Укажите слова для поиска в параметре q."}, status=400)
+        question_id = request.query_params.get('question')
+        if question_id is not None and not question_id.isdigit():
+            return Response({"error": "Параметр question должен быть ID вопроса."}, status=400)
+        results = search.TextAnswerSearch(survey_id, query, int(question_id) if question_id else None)
+        return self.get_paginated_response(self.paginate_queryset(results))
+
+class SurveyResponseBatchView(generics.GenericAPIView):
+    """Пакетная загрузка ответов на опрос через API (планшеты, офлайн-клиенты)"""
+    permission_classes = [IsAuthenticated]
+    serializer_class = ResponseBatchSerializer
+
+    def post(self, request, survey_id):
+        survey = get_object_or_404(Survey.objects.with_status(), id=survey_id)
+        if not survey.is_open:
+            return Response({"error": "Этот опрос завершён, ответы больше не принимаются."}, status=400)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = submissions.ingest_batch(survey, serializer.validated_data['responses'], request.user)
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response({"created": created, "failed": len(results) - created, "results": results}, status=200)
+
+class SurveyExportView(APIView):
+    """Потоковая выгрузка всех ответов на опрос в CSV или NDJSON (?type=csv|ndjson)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, survey_id):
+        survey = get_object_or_404(Survey, id=survey_id)
+        export_type = request.query_params.get('type', 'csv')
+        if export_type not in exports.FORMATS:
+            return Response({"error": f"Неизвестный формат выгрузки: {export_type}"}, status=400)
+        render_rows, content_type = exports.FORMATS[export_type]
+        response = StreamingHttpResponse(render_rows(exports.export_rows(survey.id)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="survey-{survey.id}-responses.{export_type}"'
+        response['X-Accel-Buffering'] = 'no'  # nginx отдаёт поток клиенту без буферизации
+        return response
+
+class SurveySnapshotView(APIView):
+    """Колоночный снимок ответов на опрос одним файлом .npz (столбцы .npy и labels.json)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, survey_id):
+        survey = get_object_or_404(Survey, id=survey_id)
+        archive = tempfile.TemporaryFile()  # удаляется, когда FileResponse закроет его после отправки
+        with tempfile.TemporaryDirectory() as directory:
+            snapshots.write_snapshot(survey, directory)
+            snapshots.write_archive(directory, archive)
+        archive.seek(0)
+        return FileResponse(archive, as_attachment=True, filename=f'survey-{survey.id}-snapshot.npz',
+                            content_type='application/zip')
+
 class RegisterView(generics.CreateAPIView):
     """Регистрация через API"""
     queryset = User.objects.all()
@@ -375,6 +693,21 @@ class LoginView(generics.GenericAPIView):
         messages.error(request, "Неверное имя пользователя или пароль.")
         return Response({"error": "Неверные учетные данные"}, status=400)
 
+class TokenView(generics.GenericAPIView):
+    """Выдача подписанного токена для API (без сессии)"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    serializer_class = LoginSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = authenticate(request, username=serializer.validated_data['username'],
+                            password=serializer.validated_data['password'])
+        if user is None:
+            return Response({"error": "Неверные учетные данные"}, status=400)
+        return Response({"token": authentication.issue_token(user), "expires_in": authentication.token_max_age()})
+
 class LogoutView(APIView):
     """Выход через API"""
     permission_classes = [IsAuthenticated]
@@ -426,4 +759,69 @@ class ResetPasswordView(generics.GenericAPIView):
             return Response({"message": "Пароль успешно сброшен"}, status=200)
         except User.DoesNotExist:
             messages.error(request, "Пользователь не найден.")
-            return Response({"error": "Пользователь не найден"}, status=404)
\ No newline at end of file
+            return Response({"error": "Пользователь не найден"}, status=404)
+
+# Async API Views (ASGI)
+# Только чтение: под ASGI-сервером (uvicorn/daphne) один процесс обслуживает много медленных клиентов,
+# пока запросы к БД ждут в пуле потоков. Права как у синхронных аналогов, но анонимам доступа нет.
+def _not_authenticated():
+    return JsonResponse({"detail": "Учетные данные не были предоставлены."}, status=403)
+
+def _not_found():
+    return JsonResponse({"detail": "Страница не найдена."}, status=404)
+
+async def async_survey_list(request):
+    """Асинхронный список опросов (?questions=<id>, ?ordering=<поле>)"""
+    if not (await authentication.aauthenticate(request)).is_authenticated:
+        return _not_authenticated()
+    surveys = Survey.objects.with_status()
+    question_id = request.GET.get('questions')
+    if question_id:
+        # Как у синхронного списка (django-filter): некорректный id — 400, а не исключение
+        if not question_id.isdigit():
+            return JsonResponse({"questions": ["Параметр questions должен быть ID вопроса."]}, status=400)
+        surveys = surveys.filter(questions__id=question_id)
+    ordering = request.GET.get('ordering')
+    if ordering in ['start_date', '-start_date', 'end_date', '-end_date']:
+        surveys = surveys.order_by(ordering)
+    data = SurveySerializer([survey async for survey in surveys], many=True).data
+    return JsonResponse(data, safe=False)
+
+async def async_survey_questions(request, survey_id):
+    """Асинхронный список вопросов опроса"""
+    if not (await authentication.aauthenticate(request)).is_authenticated:
+        return _not_authenticated()
+    questions = [question async for question in Question.objects.filter(survey_id=survey_id)]
+    return JsonResponse(QuestionSerializer(questions, many=True).data, safe=False)
+
+async def async_survey_statistics(request, survey_id):
+    """Асинхронная статистика опроса"""
+    if not (await authentication.aauthenticate(request)).is_authenticated:
+        return _not_authenticated()
+    try:
+        survey = await Survey.objects.with_respondents().aget(id=survey_id)
+    except Survey.DoesNotExist:
+        return _not_found()
+    questions = [question async for question in _questions_with_tallies(survey.id)]
+    sample = _sample_size(request.GET.get('sample', TEXT_SAMPLE_SIZE))
+    text_answers = _group_text_answers([row async for row in _text_answers_query(questions, sample)])
+    text_lengths = _group_text_lengths([row async for row in _text_lengths_query(questions)])
+    return JsonResponse(_build_statistics(questions, text_answers, text_lengths, survey.respondents))
+
+async def async_survey_answers(request, survey_id):
+    """Асинхронный список ответов на опрос, постранично по курсору ?after=<id>"""
+    if not (await authentication.aauthenticate(request)).is_authenticated:
+        return _not_authenticated()
+    try:
+        after = int(request.GET.get('after', 0))
+        page_size = int(request.GET.get('page_size', ResponseCursorPagination.page_size))
+    except ValueError:
+        return JsonResponse({"detail": "Параметры after и page_size должны быть целыми числами."}, status=400)
+    page_size = max(1, min(page_size, ResponseCursorPagination.max_page_size))
+    responses = UserResponse.objects.filter(question__survey_id=survey_id, id__gt=after).order_by('id')
+    results = UserResponseSerializer([response async for response in responses[:page_size]], many=True).data
+    next_url = None
+    if len(results) == page_size:
+        next_url = request.build_absolute_uri(f"{request.path}?after={results[-1]['id']}&page_size={page_size}")
+    return JsonResponse({'next': next_url, 'results': results})
+